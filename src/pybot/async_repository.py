@@ -0,0 +1,101 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, TypeVar
+
+from pybot.bloom import BloomFilter
+from pybot.metrics import metrics
+from pybot.model import Event, RequestLog, UserProfile
+from pybot.singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from pybot.storage import Repository
+
+T = TypeVar('T')
+
+
+@dataclass
+class AsyncRepository:
+    """Runs the blocking repository calls on a dedicated thread pool so handlers never stall the event loop."""
+
+    repo: 'Repository'
+    max_workers: int = 16
+    executor: ThreadPoolExecutor = field(init=False)
+    inflight: SingleFlight = field(init=False)
+
+    def __post_init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='repository')
+        self.inflight = SingleFlight()
+
+    async def _run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        with metrics.span('repository', fn.__name__):
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def _read(self, name: str, *args: Any) -> Any:
+        # Concurrent identical reads (e.g. several handlers loading one profile) share a single round trip.
+        return await self.inflight.do((name, *args), lambda: self._run(getattr(self.repo, name), *args))
+
+    async def save_user(self, user: UserProfile) -> None:
+        await self._run(self.repo.save_user, user)
+
+    async def get_user(self, name: str) -> UserProfile | None:
+        return await self._read('get_user', name)
+
+    async def get_users_page(self, limit: int, start_after: str | None = None) -> list[UserProfile]:
+        return await self._read('get_users_page', limit, start_after)
+
+    async def iter_users(
+        self, page_size: int = 500, start_after: str | None = None
+    ) -> AsyncIterator[list[UserProfile]]:
+        while page := await self.get_users_page(page_size, start_after):
+            yield page
+            if len(page) < page_size:
+                return
+            start_after = page[-1].username
+
+    async def save_events(self, username: str, events: list[Event]) -> None:
+        await self._run(self.repo.save_events, username, events)
+
+    async def get_past_events(self, username: str, limit: int = 60) -> list[Event]:
+        return await self._read('get_past_events', username, limit)
+
+    async def get_seen_events(self, username: str) -> BloomFilter:
+        return await self._read('get_seen_events', username)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self._run(self.repo.incr, key, amount)
+
+    async def incr_many(self, deltas: dict[str, int]) -> dict[str, int]:
+        results = await asyncio.gather(
+            *(self.incr(key, amount) for key, amount in deltas.items()), return_exceptions=True
+        )
+        return {key: total for key, total in zip(deltas, results) if isinstance(total, int)}
+
+    async def get_count(self, key: str) -> int:
+        return await self._read('get_count', key)
+
+    async def rpush(self, key: str, value: str) -> None:
+        await self._run(self.repo.rpush, key, value)
+
+    async def log_request(self, username: str, command: str, success: bool) -> None:
+        await self._run(self.repo.log_request, username, command, success)
+
+    async def log_requests(self, logs: list[RequestLog]) -> None:
+        await self._run(self.repo.log_requests, logs)
+
+    async def get_checkpoint(self, name: str) -> str | None:
+        return await self._run(self.repo.get_checkpoint, name)
+
+    async def save_checkpoint(self, name: str, value: str) -> None:
+        await self._run(self.repo.save_checkpoint, name, value)
+
+    async def warm_up(self) -> None:
+        if warm_up := getattr(self.repo, 'warm_up', None):
+            await self._run(warm_up)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        if close := getattr(self.repo, 'close', None):
+            close()
@@ -0,0 +1 @@
+"""Offline load tests and benchmarks for the bot's hot paths."""
@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from contextlib import suppress
+
+from pybot.bench.load import latency_sampler, percentile
+from pybot.service.chatgpt import ChatGPTService
+from pybot.setting import ChatGPTConfig
+
+
+class MockLLMServer:
+    """Local HTTP server speaking the chat completions API with Azure-like throttling.
+
+    More than ``capacity`` concurrent requests are answered with 429 and ``retry-after-ms``; a fraction
+    ``error_rate`` fails with 500; between ``outage`` start and end seconds after start every request gets 503.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        latency: str,
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        outage: tuple[float, float] | None = None,
+        seed: int = 0,
+    ):
+        self.capacity = capacity
+        self.rng = random.Random(seed)
+        self.latency = latency_sampler(latency, self.rng)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.outage = outage
+        self.active = 0
+        self.statuses: Counter[int] = Counter()
+        self.port = 0
+        self._server: asyncio.Server | None = None
+        self._started = 0.0
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started = time.monotonic()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while request_line := await reader.readline():
+                length = 0
+                while (header := await reader.readline()).strip():
+                    name, _, value = header.decode().partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length)) if length else {}
+                if not request_line.startswith(b'POST'):
+                    self._respond(writer, 404, b'{}')
+                else:
+                    await self._complete(writer, body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _complete(self, writer: asyncio.StreamWriter, body: dict) -> None:
+        elapsed = time.monotonic() - self._started
+        if self.outage and self.outage[0] <= elapsed < self.outage[1]:
+            return self._respond(writer, 503, b'{"error": "outage"}')
+        if self.active >= self.capacity:
+            headers = {'retry-after-ms': str(int(self.retry_after * 1000))}
+            return self._respond(writer, 429, b'{"error": "rate limited"}', headers)
+
+        self.active += 1
+        try:
+            await asyncio.sleep(self.latency())
+        finally:
+            self.active -= 1
+        if self.rng.random() < self.error_rate:
+            return self._respond(writer, 500, b'{"error": "internal"}')
+
+        content = 'mock reply'
+        if body.get('stream'):
+            chunk = json.dumps({'choices': [{'delta': {'content': content}}]})
+            self._respond(writer, 200, f'data: {chunk}\n\ndata: [DONE]\n\n'.encode(), content_type='text/event-stream')
+        else:
+            self._respond(writer, 200, json.dumps({'choices': [{'message': {'content': content}}]}).encode())
+
+    def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        headers: dict[str, str] | None = None,
+        content_type: str = 'application/json',
+    ) -> None:
+        self.statuses[status] += 1
+        extra = ''.join(f'{name}: {value}\r\n' for name, value in (headers or {}).items())
+        head = f'HTTP/1.1 {status} Mock\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n{extra}\r\n'
+        writer.write(head.encode() + body)
+
+
+async def run(server: MockLLMServer, config: ChatGPTConfig, clients: int, requests: int) -> dict[str, float]:
+    """``clients`` callers share ``requests`` completions; each sends its next one as soon as the last returns."""
+    service = ChatGPTService(config)
+    remaining = iter(range(requests))
+    latencies: list[float] = []
+    outcomes: Counter[str] = Counter()
+
+    async def client() -> None:
+        for i in remaining:
+            start = time.perf_counter()
+            reply = await service.submit(f'prompt {i}', use_cache=False)
+            latencies.append(time.perf_counter() - start)
+            outcomes['error' if reply.startswith('Error:') else 'ok'] += 1
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(client() for _ in range(clients)))
+    finally:
+        await service.close()
+    elapsed = time.perf_counter() - start
+    return {
+        'ok': outcomes['ok'],
+        'errors': outcomes['error'],
+        'throughput': outcomes['ok'] / elapsed,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        **{f'upstream_{status}': count for status, count in sorted(server.statuses.items())},
+        **service.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Drive ChatGPTService against a local throttling mock of the API.')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--capacity', type=int, default=8, help='concurrent requests the mock serves before 429s')
+    parser.add_argument('--latency', default='lognormal:0.2,0.3', help='mock completion latency distribution')
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--retry-after', type=float, default=0.5, help='Retry-After the mock sends with 429s')
+    parser.add_argument('--outage', help='START,END seconds during which the mock answers 503')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--max-concurrency', type=int, default=32)
+    parser.add_argument('--latency-target', type=float, default=1.0)
+    parser.add_argument('--hedge-after', type=float, default=0)
+    parser.add_argument('--baseline', action='store_true', help='fixed concurrency, no retries, no breaker')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    outage = tuple(float(value) for value in args.outage.split(',')) if args.outage else None
+
+    async def _main() -> dict[str, float]:
+        server = MockLLMServer(args.capacity, args.latency, args.error_rate, args.retry_after, outage, args.seed)
+        await server.start()
+        config = ChatGPTConfig(
+            basicurl=f'http://127.0.0.1:{server.port}',
+            modelname='bench',
+            apiversion='bench',
+            access_token='bench',
+            timeout=args.timeout,
+            max_connections=args.max_concurrency,
+            max_keepalive_connections=args.max_concurrency,
+            max_concurrency=args.max_concurrency,
+            latency_target=args.latency_target,
+            hedge_after=args.hedge_after,
+        )
+        if args.baseline:
+            config = config.model_copy(
+                update={
+                    'min_concurrency': args.max_concurrency,
+                    'initial_concurrency': args.max_concurrency,
+                    'max_retries': 0,
+                    'breaker_failure_threshold': 10**9,
+                }
+            )
+        try:
+            return await run(server, config, args.clients, args.requests)
+        finally:
+            await server.close()
+
+    result = asyncio.run(_main())
+    for key, value in result.items():
+        print(f'{key:>22}: {value:.3f}' if isinstance(value, float) else f'{key:>22}: {value}')
+
+
+if __name__ == '__main__':
+    main()
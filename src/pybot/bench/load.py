@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+
+from pybot.async_repository import AsyncRepository
+from pybot.bench.repository import LatentRepository
+from pybot.counter import KeywordCounter
+from pybot.handlers import TelegramCommandHandler
+from pybot.jobs import BackgroundJobQueue
+from pybot.logsink import RequestLogSink
+from pybot.messaging import MessageSender
+from pybot.metrics import metrics
+from pybot.model import UserProfile
+from pybot.ratelimit import SlidingWindowRateLimiter
+from pybot.service.chatgpt import ChatGPTService
+from pybot.service.conversation import ConversationMemory
+from pybot.service.event import EventService
+from pybot.service.user import UserService
+from pybot.setting import (
+    BatchingConfig,
+    CacheConfig,
+    ChatGPTConfig,
+    ConversationConfig,
+    CounterConfig,
+    DedupConfig,
+    LogSinkConfig,
+    MatchingConfig,
+    PrefetchConfig,
+    RateLimitConfig,
+    SenderConfig,
+    StreamingConfig,
+    WorkerConfig,
+)
+from pybot.sqlite_repository import SQLiteRepository
+
+INTERESTS = ['gaming', 'vr', 'hiking', 'jazz', 'python', 'chess', 'cooking', 'anime', 'running', 'photography']
+DEFAULT_MIX = 'events=3,add=3,openai=1,message=1,register=1,help=1'
+_HANDLERS = {
+    'help': 'help',
+    'hello': 'hello',
+    'add': 'add',
+    'register': 'register',
+    'events': 'events',
+    'more_events': 'more_events',
+    'openai': 'openai',
+    'message': 'handle_message',
+}
+_BATCH_SIZE = re.compile(r'following (\d+) users')
+_EVENT_COUNT = re.compile(r'list of (\d+)')
+
+
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Parses ``fixed:S``, ``uniform:LOW,HIGH``, ``exp:MEAN`` or ``lognormal:MEDIAN,SIGMA`` (seconds)."""
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    match kind, len(values):
+        case 'fixed', 1:
+            return lambda: values[0]
+        case 'uniform', 2:
+            return lambda: rng.uniform(values[0], values[1])
+        case 'exp', 1:
+            return lambda: rng.expovariate(1 / values[0]) if values[0] else 0.0
+        case 'lognormal', 2:
+            return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f'Unknown latency distribution: {spec}')
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for item in spec.split(','):
+        command, _, weight = item.partition('=')
+        if command.strip() not in _HANDLERS:
+            raise ValueError(f'Unknown command in mix: {command}')
+        mix[command.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(max(math.ceil(q / 100 * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+
+class MockCompletions:
+    """``httpx.MockTransport`` handler that answers chat completions after a sampled delay.
+
+    JSON-mode prompts get well-formed event lists (batched prompts get one list per user), and streamed requests
+    are answered as server-sent events spread over the sampled latency, so the real client code paths run.
+    """
+
+    def __init__(self, latency: Callable[[], float], chunks: int = 8):
+        self.latency = latency
+        self.chunks = chunks
+        self.calls = 0
+        self._names = itertools.count()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        payload = json.loads(request.content)
+        prompt = payload['messages'][-1]['content']
+        reply = self._reply(prompt, json_mode='response_format' in payload)
+        if payload.get('stream'):
+            return httpx.Response(200, headers={'content-type': 'text/event-stream'}, content=self._stream(reply))
+
+        await asyncio.sleep(self.latency())
+        return httpx.Response(200, json={'choices': [{'message': {'role': 'assistant', 'content': reply}}]})
+
+    def _events(self, count: int) -> list[dict[str, str]]:
+        return [
+            {'name': f'Synthetic Event {i}', 'date': '2025-06-01', 'link': f'https://events.example.com/{i}'}
+            for i in itertools.islice(self._names, count)
+        ]
+
+    def _reply(self, prompt: str, json_mode: bool) -> str:
+        if not json_mode:
+            return ' '.join(f'word{i}' for i in range(self.chunks * 6))
+        if batch := _BATCH_SIZE.search(prompt):
+            return json.dumps({str(i): self._events(3) for i in range(1, int(batch.group(1)) + 1)})
+        count = _EVENT_COUNT.search(prompt)
+        return json.dumps({'events': self._events(int(count.group(1)) if count else 3)})
+
+    async def _stream(self, reply: str) -> AsyncIterator[bytes]:
+        words = reply.split(' ')
+        step = max(len(words) // self.chunks, 1)
+        delay = self.latency() / math.ceil(len(words) / step)
+        for start in range(0, len(words), step):
+            await asyncio.sleep(delay)
+            delta = ' '.join(words[start : start + step]) + ' '
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}\n\n".encode()
+        yield b'data: [DONE]\n\n'
+
+
+class BenchBot:
+    """Stands in for ``telegram.Bot``: counts outgoing messages and edits after an optional API delay."""
+
+    username = 'pybot_bench'
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = 0
+        self.edited = 0
+        self._message_ids = itertools.count(1)
+
+    async def send_message(self, chat_id: int, text: str, **_: Any) -> SimpleNamespace:
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return SimpleNamespace(message_id=next(self._message_ids), chat_id=chat_id, text=text)
+
+    async def edit_message_text(self, text: str, chat_id: int | None = None, **_: Any) -> SimpleNamespace:
+        await asyncio.sleep(self.latency)
+        self.edited += 1
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+
+@dataclass
+class SyntheticMessage:
+    bot: BenchBot
+    chat: SimpleNamespace
+    text: str
+
+    async def reply_text(self, text: str, **kwargs: Any) -> SimpleNamespace:
+        return await self.bot.send_message(self.chat.id, text, **kwargs)
+
+
+@dataclass
+class SyntheticUpdate:
+    """Carries the attributes of ``telegram.Update`` that the handlers read."""
+
+    effective_user: SimpleNamespace
+    effective_chat: SimpleNamespace
+    message: SyntheticMessage
+    callback_query: None = None
+
+
+@dataclass
+class CommandStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+class LoadTest:
+    """Drives ``TelegramCommandHandler`` with an open-loop Poisson stream of synthetic updates."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.bot = BenchBot(args.telegram_latency)
+        self.completions = MockCompletions(latency_sampler(args.llm_latency, self.rng))
+        self.stats: dict[str, CommandStats] = {command: CommandStats() for command in self.mix}
+        self.loop_lag: list[float] = []
+
+        backend = LatentRepository(args.storage_latency) if args.storage == 'latent' else SQLiteRepository(':memory:')
+        self.repo = AsyncRepository(backend, max_workers=args.storage_workers)  # type: ignore[arg-type]
+        chatgpt_config = ChatGPTConfig(
+            basicurl='http://llm.bench',
+            modelname='bench',
+            apiversion='bench',
+            access_token='bench',
+            max_concurrency=args.llm_concurrency,
+            initial_concurrency=args.llm_concurrency,
+        )
+        self.chatgpt_service = ChatGPTService(
+            chatgpt_config, client=httpx.AsyncClient(transport=httpx.MockTransport(self.completions))
+        )
+        self.user_service = UserService(self.chatgpt_service, self.repo, CacheConfig(), MatchingConfig())
+        self.event_service = EventService(
+            self.chatgpt_service,
+            self.repo,
+            PrefetchConfig(enabled=args.prefetch),
+            BatchingConfig(enabled=args.batching),
+            DedupConfig(),
+        )
+        self.user_service.profile_listeners.append(self.event_service.on_profile_change)
+        rate_limit = RateLimitConfig() if args.rate_limit else RateLimitConfig(default_quota=10**9, quotas={})
+        self.log_sink = RequestLogSink(self.repo, LogSinkConfig())
+        self.jobs = BackgroundJobQueue(WorkerConfig(concurrency=args.job_workers, max_depth=10**6))
+        self.counter = KeywordCounter(self.repo, CounterConfig())
+        # Telegram's flood limits are off by default so runs stay comparable; --send-limits applies them.
+        unlimited = {f'{scope}_{limit}': 10**9 for scope in ('global', 'chat', 'group') for limit in ('rate', 'burst')}
+        sender_config = SenderConfig() if args.send_limits else SenderConfig(**unlimited)
+        self.sender = MessageSender(sender_config, self.bot)  # type: ignore[arg-type]
+        self.handler = TelegramCommandHandler(
+            self.repo,
+            self.chatgpt_service,
+            self.user_service,
+            self.event_service,
+            SlidingWindowRateLimiter(rate_limit),
+            self.log_sink,
+            StreamingConfig(enabled=args.streaming, edit_interval=0.2),
+            self.jobs,
+            self.counter,
+            self.sender,
+            ConversationMemory(self.chatgpt_service, ConversationConfig()),
+        )
+
+    def _text(self, command: str, n: int) -> str:
+        match command:
+            case 'add':
+                return f'/add keyword{n % 20}'
+            case 'register':
+                return f'/register {" ".join(self.rng.sample(INTERESTS, 3))} "synthetic user"'
+            case 'openai':
+                return f'/openai suggest something to do, request {n}'
+            case 'message':
+                return f'what should I do this weekend? ({n})'
+            case 'hello':
+                return '/hello bench'
+            case _:
+                return f'/{command}'
+
+    def _update(self, n: int) -> tuple[str, SyntheticUpdate, SimpleNamespace]:
+        command = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        user_id = self.rng.randrange(self.args.users)
+        chat = SimpleNamespace(id=user_id, type='private')
+        text = self._text(command, n)
+        update = SyntheticUpdate(
+            effective_user=SimpleNamespace(id=user_id, username=f'user{user_id}', first_name='Bench'),
+            effective_chat=chat,
+            message=SyntheticMessage(self.bot, chat, text),
+        )
+        context = SimpleNamespace(bot=self.bot, args=text.split()[1:] if text.startswith('/') else [])
+        return command, update, context
+
+    async def _dispatch(self, command: str, update: SyntheticUpdate, context: SimpleNamespace) -> None:
+        stats = self.stats[command]
+        start = time.perf_counter()
+        try:
+            await getattr(self.handler, _HANDLERS[command])(update, context)
+        except Exception:
+            stats.errors += 1
+        stats.latencies.append(time.perf_counter() - start)
+
+    async def _monitor_loop(self, interval: float = 0.01) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(time.perf_counter() - start - interval)
+
+    async def seed(self) -> None:
+        for i in range(self.args.users):
+            interests = set(self.rng.sample(INTERESTS, 3))
+            await self.repo.save_user(UserProfile(username=f'user{i}', interests=interests, description='bench'))
+        await self.user_service.load_matching_index()
+
+    async def run(self) -> dict[str, Any]:
+        await self.seed()
+        self.log_sink.start()
+        self.jobs.start()
+        self.counter.start()
+        monitor = asyncio.create_task(self._monitor_loop())
+
+        tasks = []
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        for n in itertools.count():
+            if time.perf_counter() >= deadline:
+                break
+            tasks.append(asyncio.create_task(self._dispatch(*self._update(n))))
+            await asyncio.sleep(self.rng.expovariate(self.args.rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await asyncio.wait_for(self.jobs.queue.join(), self.args.drain_timeout)
+        drained = time.perf_counter() - start
+
+        monitor.cancel()
+        await self.close()
+        return self.report(len(tasks), elapsed, drained)
+
+    async def close(self) -> None:
+        await self.jobs.close()
+        await self.sender.close()
+        await self.event_service.close()
+        if self.handler.conversations is not None:
+            await self.handler.conversations.close()
+        await self.counter.close()
+        await self.log_sink.close()
+        await self.chatgpt_service.close()
+        self.repo.close()
+
+    def report(self, updates: int, elapsed: float, drained: float) -> dict[str, Any]:
+        def summary(values: list[float]) -> dict[str, float]:
+            return {
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': max(values, default=0.0) * 1000,
+            }
+
+        latencies = [latency for stats in self.stats.values() for latency in stats.latencies]
+        return {
+            'updates': updates,
+            'throughput': updates / elapsed if elapsed else 0.0,
+            'drain_seconds': drained,
+            'handlers': summary(latencies),
+            'commands': {
+                command: {'count': len(stats.latencies), 'errors': stats.errors, **summary(stats.latencies)}
+                for command, stats in self.stats.items()
+            },
+            'loop_lag': summary(self.loop_lag),
+            'phases': self.phases(),
+            'llm_calls': self.completions.calls,
+            'messages_sent': self.bot.sent,
+            'messages_edited': self.bot.edited,
+            'jobs': self.jobs.metrics(),
+        }
+
+    @staticmethod
+    def phases() -> dict[str, dict[str, float]]:
+        phases: dict[str, dict[str, float]] = {}
+        for (_, phase, operation), (count, total) in metrics.phase_seconds.totals().items():
+            entry = phases.setdefault(f'{phase}:{operation}' if operation else phase, {'count': 0, 'total_ms': 0.0})
+            entry['count'] += count
+            entry['total_ms'] += total * 1000
+        return phases
+
+
+def print_report(result: dict[str, Any]) -> None:
+    def row(name: str, values: dict[str, float], count: Any = '', errors: Any = '') -> str:
+        return (
+            f"{name:14} {count:>7} {errors:>6} {values['p50_ms']:9.1f} {values['p95_ms']:9.1f} "
+            f"{values['p99_ms']:9.1f} {values['max_ms']:9.1f}"
+        )
+
+    print(f"updates={result['updates']} throughput={result['throughput']:.1f}/s drain={result['drain_seconds']:.1f}s")
+    print(f"{'':14} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for command, stats in result['commands'].items():
+        print(row(command, stats, stats['count'], stats['errors']))
+    print(row('all handlers', result['handlers'], result['updates']))
+    print(row('event loop lag', result['loop_lag']))
+    for phase, stats in sorted(result['phases'].items(), key=lambda item: -item[1]['total_ms']):
+        print(f"{phase:32} {stats['count']:>7} {stats['total_ms'] / max(stats['count'], 1):9.2f} ms avg")
+    print(
+        f"llm calls={result['llm_calls']} sent={result['messages_sent']} edited={result['messages_edited']} "
+        f"jobs={result['jobs']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Load-test the Telegram handlers with synthetic updates, a mock LLM and an offline storage backend.'
+    )
+    parser.add_argument('--rate', type=float, default=50, help='mean updates per second (Poisson arrivals)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to generate load for')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='command weights, e.g. events=3,add=1')
+    parser.add_argument('--llm-latency', default='lognormal:0.8,0.5', help='fixed:S, uniform:A,B, exp:M, lognormal:M,S')
+    parser.add_argument('--llm-concurrency', type=int, default=10)
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='seconds per Bot API call')
+    parser.add_argument('--storage', choices=['sqlite', 'latent'], default='sqlite')
+    parser.add_argument('--storage-latency', type=float, default=0.02, help='round trip of the latent backend')
+    parser.add_argument('--storage-workers', type=int, default=16)
+    parser.add_argument('--job-workers', type=int, default=8)
+    parser.add_argument('--streaming', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--prefetch', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--batching', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--rate-limit', action=argparse.BooleanOptionalAction, default=False)
+    parser.add_argument('--send-limits', action=argparse.BooleanOptionalAction, default=False)
+    parser.add_argument('--drain-timeout', type=float, default=60, help='seconds to wait for background jobs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON for regression tracking')
+    args = parser.parse_args()
+
+    result = asyncio.run(LoadTest(args).run())
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == '__main__':
+    main()
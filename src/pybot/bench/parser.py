@@ -0,0 +1,55 @@
+import argparse
+import timeit
+
+from pybot.model import Event
+from pybot.service.event_parser import parse_events
+
+# Synthetic samples of the response shapes the parser must handle: the JSON contract and common free-text variants.
+SAMPLE_RESPONSES = [
+    '{"events": [{"name": "VR Arena Night", "date": "2025-06-14", "link": "https://vrarena.example.com"}, '
+    '{"name": "Indie Game Jam", "date": "2025-07-02", "link": "https://jam.example.com"}, '
+    '{"name": "Retro Console Swap", "date": "2025-08-21", "link": "https://retro.example.com"}]}',
+    '```json\n{"events": [{"name": "Sci-Fi Book Club - Dune Edition", "date": "March 3, 2025", '
+    '"link": "https://books.example.com/dune"}, {"name": "Worldbuilding Workshop", "date": "March 17, 2025", '
+    '"link": "https://write.example.com"}, {"name": "Space Opera Trivia", "date": "April 1, 2025", '
+    '"link": "https://trivia.example.com"}]}\n```',
+    '1. Virtual Hiking Expo - June 5, 2025 - https://hike.example.com\n'
+    '2. Trail-Running Masterclass - June 12, 2025 - https://trail.example.com\n'
+    '3. Outdoor Photography Walk - June 19, 2025 - https://photo.example.com',
+    'Here are some events you might enjoy:\n\n'
+    '1. **Name:** Jazz Improv Online - **Date:** 2025-09-09 - **URL:** https://jazz.example.com\n'
+    '2. **Name:** Lo-Fi Beat Making - **Date:** 2025-09-16 - **URL:** https://lofi.example.com\n'
+    '3. **Name:** Error Handling in Music Tech - **Date:** 2025-09-23 - **URL:** https://musictech.example.com',
+    'Error: request timed out',
+]
+
+
+def legacy_parse_events(response: str) -> list[Event]:
+    # The line-by-line parser this module replaced, kept for comparison.
+    if 'Error' in response:
+        return []
+    events = []
+    for line in response.strip().split('\n'):
+        if line.strip() and line[0].isdigit():
+            parts = line.split(' - ')
+            if not len(parts) == 3:
+                continue
+            name, date, url = parts
+            events.append(Event(**{'name': name[3:].strip(), 'date': date.strip(), 'link': url.strip()}))
+    return events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Micro-benchmark the event parsers over sample completions.')
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, parse in (('legacy', legacy_parse_events), ('current', parse_events)):
+        parsed = [len(parse(response)) for response in SAMPLE_RESPONSES]
+        elapsed = timeit.timeit(lambda: [parse(response) for response in SAMPLE_RESPONSES], number=args.number)
+        per_response = elapsed / (args.number * len(SAMPLE_RESPONSES)) * 1e6
+        print(f'{name:8} {per_response:8.2f} us/response  events per response: {parsed}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import time
+
+from redis.asyncio import Redis
+
+from pybot.counter import KeywordCounter
+from pybot.ratelimit import SlidingWindowRateLimiter
+from pybot.redis_state import RedisCounterStore, RedisRateLimitStore
+from pybot.setting import CounterConfig, RateLimitConfig
+
+
+def _client(url: str | None) -> Redis:
+    if url:
+        return Redis.from_url(url, decode_responses=True)
+    from fakeredis import FakeAsyncRedis  # optional, only for offline runs
+
+    return FakeAsyncRedis(decode_responses=True)
+
+
+async def run(client: Redis, replicas: int, requests: int, quota: int, sync_every: int) -> dict[str, float]:
+    """Spreads one user's requests round-robin over ``replicas`` limiters that share state through Redis."""
+    prefix = f'bench{time.monotonic_ns()}'
+    config = RateLimitConfig(window=60, default_quota=quota, quotas={})
+    limiters = [
+        SlidingWindowRateLimiter(config, RedisRateLimitStore(client, config.window, prefix)) for _ in range(replicas)
+    ]
+    counters = [KeywordCounter(RedisCounterStore(client, prefix), CounterConfig()) for _ in range(replicas)]
+
+    allowed = 0
+    for i in range(requests):
+        if limiters[i % replicas].allow('bench-user', 'events'):
+            allowed += 1
+            await counters[i % replicas].incr('bench-keyword')
+        if sync_every and i % sync_every == 0:
+            await asyncio.gather(*(limiter.sync() for limiter in limiters))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(counters[i % replicas].incr(f'bench-{i % 50}') for i in range(requests)))
+    incr_rate = requests / (time.perf_counter() - start)
+    return {
+        'allowed': allowed,
+        'count': await RedisCounterStore(client, prefix).get_count('bench-keyword'),
+        'incr_per_second': incr_rate,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Check that replicas sharing Redis enforce one rate limit together.')
+    parser.add_argument('--url', help='redis:// URL; without it an in-process fakeredis server is used')
+    parser.add_argument('--replicas', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--quota', type=int, default=30)
+    parser.add_argument('--sync-every', type=int, default=1, help='sync limiters every N requests (0 disables)')
+    args = parser.parse_args()
+
+    async def _main() -> dict[str, float]:
+        client = _client(args.url)
+        try:
+            return await run(client, args.replicas, args.requests, args.quota, args.sync_every)
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(_main())
+    print(f'replicas={args.replicas} requests={args.requests} quota={args.quota}')
+    print(f"allowed:   {result['allowed']} (unsynced replicas would allow up to {args.quota * args.replicas})")
+    print(f"counted:   {result['count']}")
+    print(f"incr rate: {result['incr_per_second']:8.1f} increments/s")
+
+
+if __name__ == '__main__':
+    main()
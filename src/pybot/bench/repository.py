@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import time
+
+from pybot.async_repository import AsyncRepository
+from pybot.bloom import BloomFilter, normalize_name
+from pybot.model import Event, RequestLog, UserProfile
+
+
+class LatentRepository:
+    """In-memory stand-in for FirebaseRepository that sleeps on every call to emulate a gRPC round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.users: dict[str, UserProfile] = {}
+        self.events: dict[str, list[Event]] = {}
+        self.counters: dict[str, int] = {}
+        self.logs: list[tuple[str, str, bool]] = []
+        self.checkpoints: dict[str, str] = {}
+
+    def _round_trip(self) -> None:
+        time.sleep(self.latency)
+
+    def save_user(self, user: UserProfile) -> None:
+        self._round_trip()
+        self.users[user.username] = user
+
+    def get_user(self, name: str) -> UserProfile | None:
+        self._round_trip()
+        return self.users.get(name)
+
+    def get_users_page(self, limit: int, start_after: str | None = None) -> list[UserProfile]:
+        self._round_trip()
+        names = sorted(name for name in self.users if start_after is None or name > start_after)
+        return [self.users[name] for name in names[:limit]]
+
+    def save_events(self, username: str, events: list[Event]) -> None:
+        self._round_trip()
+        self.events.setdefault(username, []).extend(events)
+
+    def get_past_events(self, username: str, limit: int = 60) -> list[Event]:
+        self._round_trip()
+        return self.events.get(username, [])[-limit:]
+
+    def get_seen_events(self, username: str) -> BloomFilter:
+        self._round_trip()
+        seen = BloomFilter()
+        for event in self.events.get(username, []):
+            seen.add(normalize_name(event.name))
+        return seen
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        self._round_trip()
+        self.counters[key] = self.counters.get(key, 0) + amount
+        return self.counters[key]
+
+    def get_count(self, key: str) -> int:
+        self._round_trip()
+        return self.counters.get(key, 0)
+
+    def rpush(self, key: str, value: str) -> None:
+        self._round_trip()
+
+    def log_request(self, username: str, command: str, success: bool) -> None:
+        self._round_trip()
+        self.logs.append((username, command, success))
+
+    def log_requests(self, logs: list[RequestLog]) -> None:
+        self._round_trip()
+        self.logs.extend((log.username, log.command, log.success) for log in logs)
+
+    def get_checkpoint(self, name: str) -> str | None:
+        self._round_trip()
+        return self.checkpoints.get(name)
+
+    def save_checkpoint(self, name: str, value: str) -> None:
+        self._round_trip()
+        self.checkpoints[name] = value
+
+
+async def _blocking_update(repo: LatentRepository, username: str) -> None:
+    # What the handler decorators did before: every repository call runs on the event loop thread.
+    repo.get_user(username)
+    repo.log_request(username, 'events', True)
+
+
+async def _async_update(repo: AsyncRepository, username: str) -> None:
+    await repo.get_user(username)
+    await repo.log_request(username, 'events', True)
+
+
+async def run(updates: int, latency: float, workers: int, users: int = 100) -> dict[str, float]:
+    backend = LatentRepository(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_blocking_update(backend, f'user{i % users}') for i in range(updates)))
+    blocking = updates / (time.perf_counter() - start)
+
+    repo = AsyncRepository(backend, max_workers=workers)  # type: ignore[arg-type]
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(_async_update(repo, f'user{i % users}') for i in range(updates)))
+        non_blocking = updates / (time.perf_counter() - start)
+    finally:
+        repo.close()
+
+    return {'blocking': blocking, 'async': non_blocking}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure updates/s through the repository layer with a slow backend.')
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated round trip in seconds')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.updates, args.latency, args.workers))
+    print(f"updates={args.updates} latency={args.latency * 1000:.0f}ms workers={args.workers}")
+    print(f"blocking repository: {result['blocking']:8.1f} updates/s")
+    print(f"async repository:    {result['async']:8.1f} updates/s ({result['async'] / result['blocking']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def profile_imports(module: str) -> tuple[float, list[tuple[str, int, int, int]]]:
+    """Imports ``module`` in a fresh interpreter under ``-X importtime``.
+
+    Returns the wall time in seconds and one ``(name, depth, self_us, cumulative_us)`` row per imported module.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, check=False
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise SystemExit(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if match := _IMPORT_TIME.match(line):
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return elapsed, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Break down the import time of the bot entry point.')
+    parser.add_argument('--module', default='pybot.chatbot')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    elapsed, rows = profile_imports(args.module)
+    by_package: dict[str, int] = defaultdict(int)
+    for name, _, self_us, _ in rows:
+        by_package[name.split('.')[0]] += self_us
+
+    print(f'import {args.module}: {elapsed * 1000:.0f}ms wall, {sum(row[2] for row in rows) / 1000:.0f}ms in imports')
+    print(f'\n{"top-level package":40} {"self ms":>9}')
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[: args.top]:
+        print(f'{package:40} {self_us / 1000:9.1f}')
+
+    print(f'\n{"module (cumulative)":60} {"self ms":>9} {"cum ms":>9}')
+    for name, depth, self_us, cumulative_us in sorted(rows, key=lambda row: -row[3])[: args.top]:
+        print(f'{"  " * depth + name:60} {self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
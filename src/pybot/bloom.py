@@ -0,0 +1,68 @@
+import hashlib
+import math
+import re
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_name(name: str) -> str:
+    return _NON_WORD.sub(' ', name.lower()).strip()
+
+
+class BloomFilter:
+    """Bloom filter with double hashing that ages old items out instead of saturating.
+
+    Items go into a current generation of ``size_bits``. Once it holds as many items as it is sized for
+    (``size_bits * ln 2 / hashes``, where the false-positive rate is about ``2 ** -hashes``), it becomes the previous
+    generation and the one before is dropped. Lookups check both, so the most recent one to two capacities' worth
+    of items are remembered and the false-positive rate stays bounded however many items are added.
+
+    Serialises to raw bytes, current generation first, so it can live in a Firestore field. A single generation
+    written before rotation existed is read as the current one, unless it is too full to be useful.
+    """
+
+    def __init__(self, size_bits: int = 8192, hashes: int = 6, data: bytes | None = None):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.capacity = max(int(size_bits * math.log(2) / hashes), 1)
+        size = size_bits // 8
+        data = data or b''
+        self.bits = bytearray(data[:size]) if len(data) in (size, 2 * size) else bytearray(size)
+        self.previous = bytearray(data[size:]) if len(data) == 2 * size else bytearray(size)
+        self._count = self._estimate(self.bits)
+        if self._count > self.capacity * 1.25:
+            # Only a filter from before rotation gets this full; its false positives would hide most new items.
+            self.bits, self._count = bytearray(size), 0
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hashes)]
+
+    def _estimate(self, bits: bytearray) -> int:
+        # Expected number of distinct items behind the fraction of set bits (Swamidass and Baldi).
+        unset = self.size_bits - int.from_bytes(bits, 'little').bit_count()
+        if unset == 0:
+            return self.size_bits
+        return round(-self.size_bits / self.hashes * math.log(unset / self.size_bits))
+
+    @staticmethod
+    def _has(bits: bytearray, positions: list[int]) -> bool:
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in positions)
+
+    def add(self, item: str) -> None:
+        positions = self._positions(item)
+        if self._has(self.bits, positions):
+            return
+        if self._count >= self.capacity:
+            self.previous, self.bits, self._count = self.bits, bytearray(self.size_bits // 8), 0
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, item: str) -> bool:
+        positions = self._positions(item)
+        return self._has(self.bits, positions) or self._has(self.previous, positions)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits + self.previous)
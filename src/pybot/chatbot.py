@@ -1,35 +1,150 @@
+import asyncio
+import logging
+import time
 from typing import Self
 
 import pytz
-from handlers import TelegramCommandHandler
-from repository import FirebaseRepository
-from service.chatgpt import ChatGPTService
-from service.event import EventService
-from service.user import UserService
-from setting import config
 from telegram import BotCommand
-from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, JobQueue, MessageHandler, filters
+from telegram.ext import (
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    JobQueue,
+    MessageHandler,
+    filters,
+)
 
-from pybot.model import Command
+from pybot.async_repository import AsyncRepository
+from pybot.counter import CounterStore, KeywordCounter
+from pybot.digest import DigestBroadcaster
+from pybot.handlers import TelegramCommandHandler
+from pybot.jobs import BackgroundJobQueue
+from pybot.logsink import RequestLogSink
+from pybot.messaging import InstrumentedRequest, MessageSender
+from pybot.metrics import MetricsServer, metrics
+from pybot.model import Command, UserProfile
+from pybot.ratelimit import SlidingWindowRateLimiter
+from pybot.service.chatgpt import ChatGPTService
+from pybot.service.completion_cache import CompletionCache
+from pybot.service.conversation import ConversationMemory
+from pybot.service.event import EventService
+from pybot.service.user import UserService
+from pybot.setting import AppConfig, get_config
+from pybot.storage import create_repository
 
 
 class TelegramBot:
-    def __init__(self):
-        self.config = config
-        self.chatgpt_service = ChatGPTService(config.chatgpt)
-        self.firebase_repo = FirebaseRepository()
-        self.user_service = UserService(self.chatgpt_service, self.firebase_repo)
-        self.event_service = EventService(self.chatgpt_service, self.firebase_repo)
+    def __init__(self, config: AppConfig | None = None):
+        started = time.perf_counter()
+        self.config = config = config or get_config()
+        completion_cache = CompletionCache(config.completion_cache) if config.completion_cache.enabled else None
+        self.chatgpt_service = ChatGPTService(config.chatgpt, cache=completion_cache)
+        self.repo = AsyncRepository(
+            create_repository(config.storage, counter_shards=config.counter.shards),
+            max_workers=config.storage.max_workers,
+        )
+        # With Redis, replicas share the user cache, rate-limit windows and counters; the per-process user cache then
+        # only absorbs bursts, so its TTL is cut to bound how stale another replica's write can look.
+        self.redis = None
+        user_cache_config = config.user_cache
+        shared_user_cache = None
+        rate_limit_store = None
+        counter_store: CounterStore = self.repo
+        if config.redis.enabled:
+            from pybot.redis_state import RedisCache, RedisCounterStore, RedisRateLimitStore, create_redis
+
+            self.redis = create_redis(config.redis)
+            user_cache_config = config.user_cache.model_copy(
+                update={'ttl': min(config.user_cache.ttl, config.redis.local_ttl)}
+            )
+            shared_user_cache = RedisCache(
+                self.redis,
+                'user',
+                config.user_cache.ttl,
+                UserProfile.model_dump_json,
+                UserProfile.model_validate_json,
+                prefix=config.redis.prefix,
+            )
+            rate_limit_store = RedisRateLimitStore(self.redis, config.rate_limit.window, config.redis.prefix)
+            counter_store = RedisCounterStore(self.redis, self.repo, config.redis.prefix, config.counter.maxsize)
+        self.user_service = UserService(
+            self.chatgpt_service,
+            self.repo,
+            user_cache_config,
+            config.matching,
+            shared_user_cache,
+        )
+        self.event_service = EventService(
+            self.chatgpt_service,
+            self.repo,
+            config.prefetch,
+            config.batching,
+            config.dedup,
+        )
+        self.user_service.profile_listeners.append(self.event_service.on_profile_change)
+        self.rate_limiter = SlidingWindowRateLimiter(config.rate_limit, rate_limit_store)
+        self.log_sink = RequestLogSink(self.repo, config.log_sink)
+        self.jobs = BackgroundJobQueue(config.workers)
+        self.counter = KeywordCounter(counter_store, config.counter)
+        self.sender = MessageSender(config.sender)
+        self.conversations = (
+            ConversationMemory(self.chatgpt_service, config.conversation) if config.conversation.enabled else None
+        )
         self.command_handler = TelegramCommandHandler(
-            self.firebase_repo,
+            self.repo,
             self.chatgpt_service,
             self.user_service,
             self.event_service,
+            self.rate_limiter,
+            self.log_sink,
+            config.streaming,
+            self.jobs,
+            self.counter,
+            self.sender,
+            self.conversations,
+        )
+        self.digest = (
+            DigestBroadcaster(self.repo, self.event_service, self.sender, config.digest)
+            if config.digest.enabled
+            else None
         )
         job_queue = JobQueue()
         job_queue.scheduler.configure(timezone=pytz.UTC)
 
-        self.app = ApplicationBuilder().token(config.telegram.access_token).job_queue(job_queue).build()
+        self.metrics_server = (
+            MetricsServer(metrics, config.metrics.host, config.metrics.port) if config.metrics.enabled else None
+        )
+        self.register_metrics()
+
+        self.app = (
+            ApplicationBuilder()
+            .token(config.telegram.access_token)
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .job_queue(job_queue)
+            .concurrent_updates(config.telegram.concurrent_updates)
+            .build()
+        )
+        logging.info(f'Bot constructed in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+    def register_metrics(self) -> None:
+        metrics.register_collector('jobs', self.jobs.metrics)
+        metrics.register_collector('user_cache', self.user_service.cache.stats)
+        metrics.register_collector('llm', self.chatgpt_service.stats)
+        metrics.register_collector('sender', self.sender.stats)
+        metrics.register_collector('singleflight_chatgpt', self.chatgpt_service.inflight.stats)
+        metrics.register_collector('singleflight_events', self.event_service.inflight.stats)
+        metrics.register_collector('singleflight_repository', self.repo.inflight.stats)
+        if self.chatgpt_service.cache is not None:
+            metrics.register_collector('completion_cache', self.chatgpt_service.cache.stats)
+        if self.event_service.prefetcher is not None:
+            metrics.register_collector('prefetch', self.event_service.prefetcher.stats)
+        if self.event_service.batcher is not None:
+            metrics.register_collector('batching', self.event_service.batcher.stats)
+        if self.conversations is not None:
+            metrics.register_collector('conversations', self.conversations.stats)
+        if self.digest is not None:
+            metrics.register_collector('digest', self.digest.stats)
 
     def setup_handlers(self):
         self.app.add_handler(CommandHandler(Command.START, self.command_handler.start))
@@ -49,9 +164,61 @@ class TelegramBot:
         await app.bot.set_my_commands(commands)
         return self
 
+    async def startup(self, app) -> None:
+        # Runs before the webhook is bound, so it only starts local tasks; anything that talks to the network is
+        # left to warm_up, which runs in the background while the webhook starts accepting updates.
+        metrics.configure(self.config.metrics)
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        self.log_sink.start()
+        self.sender.start(app.bot)
+        self.jobs.start(app.job_queue)
+        self.counter.start()
+        if self.rate_limiter.store is not None:
+            app.job_queue.run_repeating(
+                self.sync_rate_limits, interval=self.config.redis.sync_interval, name='rate-limit-sync'
+            )
+        if self.digest is not None:
+            self.digest.schedule(app.job_queue)
+        app.create_task(self.warm_up(app))
+
+    async def warm_up(self, app) -> None:
+        started = time.perf_counter()
+        steps = {'bot commands': self.set_bot_commands(app), 'matching index': self.user_service.load_matching_index()}
+        if self.config.startup.warm_up:
+            steps.update({'repository': self.repo.warm_up(), 'chatgpt': self.chatgpt_service.warm_up()})
+        results = await asyncio.gather(*steps.values(), return_exceptions=True)
+        for step, result in zip(steps, results):
+            if isinstance(result, Exception):
+                logging.warning(f'Warm-up step {step} failed: {result}')
+        logging.info(f'Warm-up finished in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+    async def sync_rate_limits(self, _: ContextTypes.DEFAULT_TYPE) -> None:
+        try:
+            await self.rate_limiter.sync()
+        except Exception as e:
+            logging.warning(f'Rate limit sync failed: {e}')
+
+    async def shutdown(self, _) -> None:
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        metrics.close()
+        await self.jobs.close()
+        await self.sender.close()
+        await self.event_service.close()
+        if self.conversations is not None:
+            await self.conversations.close()
+        await self.counter.close()
+        await self.log_sink.close()
+        await self.chatgpt_service.close()
+        self.repo.close()
+        if self.redis is not None:
+            await self.redis.aclose()
+
     def run(self):
         self.setup_handlers()
-        self.app.post_init = self.set_bot_commands
+        self.app.post_init = self.startup
+        self.app.post_shutdown = self.shutdown
         self.app.run_webhook(
             listen='0.0.0.0',
             port=self.config.app_port,
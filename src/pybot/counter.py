@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Protocol
+
+from pybot.cache import TTLCache
+from pybot.setting import CounterConfig
+
+
+class CounterStore(Protocol):
+    async def incr(self, key: str, amount: int = 1) -> int: ...
+
+    async def incr_many(self, deltas: dict[str, int]) -> dict[str, int]:
+        """Applies ``deltas`` and returns the new totals; keys missing from the result were not applied."""
+        ...
+
+    async def get_count(self, key: str) -> int: ...
+
+
+class KeywordCounter:
+    """Keyword counts for /add, optionally coalescing bursts of increments into one write per key and interval.
+
+    With ``coalesce_interval`` set, ``incr`` only touches memory: the returned count is the last persisted total plus
+    the increments being flushed and those still waiting, so concurrent callers each see a distinct count.
+    """
+
+    def __init__(self, store: CounterStore, config: CounterConfig):
+        self.store = store
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self._pending: dict[str, int] = {}
+        self._flushing: dict[str, int] = {}
+        self._persisted: TTLCache[str, int] = TTLCache(config.maxsize, ttl=float('inf'))
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def coalescing(self) -> bool:
+        return self.config.coalesce_interval > 0
+
+    def start(self) -> None:
+        if self.coalescing and self._task is None:
+            self._task = asyncio.create_task(self._run(), name='keyword-counter-flush')
+
+    async def incr(self, key: str) -> int:
+        if not self.coalescing:
+            return await self.store.incr(key)
+
+        if self._persisted.get(key) is None:
+            persisted = await self.store.get_count(key)
+            # A flush that finished meanwhile has a newer total.
+            if self._persisted.get(key) is None:
+                self._persisted.set(key, persisted)
+        # No await from here on, so the increment and the count it returns stay consistent.
+        self._pending[key] = self._pending.get(key, 0) + 1
+        return (self._persisted.get(key) or 0) + self._flushing.get(key, 0) + self._pending[key]
+
+    async def flush(self) -> None:
+        if not self._pending or self._flushing:
+            return
+        self._flushing, self._pending = self._pending, {}
+        totals: dict[str, int] = {}
+        try:
+            totals = await self.store.incr_many(self._flushing)
+        except Exception as e:
+            self.logger.error(f'Failed to flush counters: {e}')
+        finally:
+            flushed, self._flushing = self._flushing, {}
+            for key, amount in flushed.items():
+                if key in totals:
+                    self._persisted.set(key, totals[key])
+                else:
+                    self._pending[key] = self._pending.get(key, 0) + amount
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.coalesce_interval)
+            await self.flush()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import UTC, datetime
+from datetime import time as clock_time
+from typing import Any
+
+from telegram.ext import ContextTypes, JobQueue
+
+from pybot.async_repository import AsyncRepository
+from pybot.jobs import Priority
+from pybot.messaging import MessageSender, format_events
+from pybot.model import UserProfile
+from pybot.service.event import EventService
+from pybot.setting import DigestConfig
+
+
+class DigestBroadcaster:
+    """Pushes a daily set of recommended events to every registered user.
+
+    Users are read page by page in username order and each page is worked through with at most ``concurrency``
+    users in flight, so memory stays flat however many users there are. The last username of every finished page
+    is checkpointed in the repository; a run that stopped part-way resumes after it, so at most one page of users
+    can get the same digest twice. Events are generated fresh and exclude those the user has already been sent.
+    Messages go out on the sender's low-priority lane, behind interactive replies.
+    """
+
+    CHECKPOINT = 'digest'
+
+    def __init__(
+        self,
+        repo: AsyncRepository,
+        event_service: EventService,
+        sender: MessageSender,
+        config: DigestConfig,
+    ):
+        self.repo = repo
+        self.event_service = event_service
+        self.sender = sender
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.sent = 0
+        self.skipped = 0
+        self.unreachable = 0
+        self.failed = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def run_id(now: datetime | None = None) -> str:
+        return (now or datetime.now(UTC)).date().isoformat()
+
+    def schedule(self, job_queue: JobQueue) -> None:
+        at = clock_time(self.config.hour, self.config.minute, tzinfo=UTC)
+        job_queue.run_daily(self._run_job, time=at, name='digest')
+        job_queue.run_once(self._resume_job, when=0, name='digest-resume')
+
+    async def run(self, run_id: str) -> None:
+        if self._lock.locked():
+            self.logger.info(f'Digest {run_id} skipped: a run is already in progress')
+            return
+        async with self._lock:
+            checkpoint = await self._load_checkpoint()
+            start_after = None
+            if checkpoint.get('run') == run_id:
+                if checkpoint.get('done'):
+                    return
+                start_after = checkpoint.get('after')
+
+            started, unreachable = time.perf_counter(), self.unreachable
+            self.logger.info(f'Digest {run_id} started' + (f' after {start_after}' if start_after else ''))
+            semaphore = asyncio.Semaphore(self.config.concurrency)
+            async for page in self.repo.iter_users(self.config.page_size, start_after):
+                await asyncio.gather(*(self._deliver(user, semaphore) for user in page))
+                await self._save_checkpoint({'run': run_id, 'after': page[-1].username, 'done': False})
+            await self._save_checkpoint({'run': run_id, 'after': None, 'done': True})
+            self.logger.info(f'Digest {run_id} finished in {time.perf_counter() - started:.0f}s: {self.stats()}')
+            if missing := self.unreachable - unreachable:
+                self.logger.warning(
+                    f'Digest {run_id} skipped {missing} users with no known chat; they are reached once they next '
+                    f'message the bot in private'
+                )
+
+    async def resume(self) -> None:
+        """Finishes today's run if the process stopped in the middle of it."""
+        checkpoint = await self._load_checkpoint()
+        if checkpoint.get('run') == self.run_id() and not checkpoint.get('done'):
+            await self.run(checkpoint['run'])
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'running': self._lock.locked(),
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'unreachable': self.unreachable,
+            'failed': self.failed,
+        }
+
+    async def _deliver(self, user: UserProfile, semaphore: asyncio.Semaphore) -> None:
+        # Profiles registered before chat ids were stored are keyed by the numeric user id when there is no username.
+        chat_id = user.chat_id if user.chat_id is not None else int(user.username) if user.username.isdigit() else None
+        if not user.interests:
+            self.skipped += 1
+            return
+        if chat_id is None:
+            self.unreachable += 1
+            return
+
+        async with semaphore:
+            try:
+                events = await self.event_service.digest_events(user)
+                if not events:
+                    self.skipped += 1
+                    return
+                await self.sender.send(chat_id, format_events(self.config.title, events), Priority.LOW)
+            except Exception as e:
+                self.failed += 1
+                self.logger.warning(f'Digest for {user.username} failed: {e}')
+                return
+        self.sent += 1
+
+    async def _load_checkpoint(self) -> dict[str, Any]:
+        value = await self.repo.get_checkpoint(self.CHECKPOINT)
+        return json.loads(value) if value else {}
+
+    async def _save_checkpoint(self, checkpoint: dict[str, Any]) -> None:
+        await self.repo.save_checkpoint(self.CHECKPOINT, json.dumps(checkpoint))
+
+    async def _run_job(self, _: ContextTypes.DEFAULT_TYPE) -> None:
+        await self.run(self.run_id())
+
+    async def _resume_job(self, _: ContextTypes.DEFAULT_TYPE) -> None:
+        await self.resume()
@@ -1,13 +1,20 @@
 import logging
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Awaitable, Callable
 
-from service import ChatGPTService, EventService, UserService
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram import Chat, InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
+from pybot.async_repository import AsyncRepository
+from pybot.counter import KeywordCounter
+from pybot.jobs import BackgroundJobQueue, Priority, Submission
+from pybot.logsink import RequestLogSink
+from pybot.messaging import MessageSender, ProgressiveMessage, format_events
+from pybot.metrics import metrics
 from pybot.model import Command
-from pybot.repository import FirebaseRepository
+from pybot.ratelimit import SlidingWindowRateLimiter
+from pybot.service import ChatGPTService, ConversationMemory, EventService, UserService
+from pybot.setting import StreamingConfig
 
 
 def before_request(
@@ -27,21 +34,30 @@ def before_request(
 
         cmd = None
         if update.message and update.message.text:
-            cmd = update.message.text.split()[0][1:]
+            text = update.message.text
+            cmd = text.split()[0][1:].split('@')[0] if text.startswith('/') else Command.MESSAGE
         elif update.callback_query:
             cmd = update.callback_query.data
 
-        if cmd and not self._check_rate_limit(username, cmd):
-            if update.message:
-                await update.message.reply_text('Rate limit exceeded. Try again in a minute.')
-            elif update.callback_query:
-                await context.bot.send_message(
-                    chat_id=update.callback_query.message.chat.id,
-                    text='Rate limit exceeded. Try again in a minute.',
-                )
-            return
+        with metrics.request(handler.__name__):
+            with metrics.span('rate_limit'):
+                allowed = not cmd or self._check_rate_limit(username, cmd)
+            if not allowed:
+                if update.message:
+                    await self.sender.send(update.effective_chat.id, 'Rate limit exceeded. Try again in a minute.')
+                elif update.callback_query:
+                    await self.sender.send(
+                        update.callback_query.message.chat.id, 'Rate limit exceeded. Try again in a minute.'
+                    )
+                return
 
-        await handler(self, update, context)
+            if update.effective_chat and update.effective_chat.type == 'private':
+                # Profiles registered before chat ids were stored pick theirs up on the next message of any kind.
+                try:
+                    await self.user_service.remember_chat(username, update.effective_chat.id)
+                except Exception as e:
+                    self.logger.warning(f'Failed to record the chat of {username}: {e}')
+            await handler(self, update, context)
 
     return wrapper
 
@@ -71,10 +87,10 @@ def after_request(
             username = user.username or str(user.id)
             try:
                 await handler(self, update, context)
-                self._log_request(username, command_name, True)
+                await self._log_request(username, command_name, True)
             except Exception as e:
                 self.logger.error(f'Error in {command_name}: {e}')
-                self._log_request(username, command_name, False)
+                await self._log_request(username, command_name, False)
                 raise
 
         return wrapper
@@ -85,22 +101,85 @@ def after_request(
 class TelegramCommandHandler:
     def __init__(
         self,
-        repo: FirebaseRepository,
+        repo: AsyncRepository,
         chatgpt_service: ChatGPTService,
         user_service: UserService,
         event_service: EventService,
+        rate_limiter: SlidingWindowRateLimiter,
+        log_sink: RequestLogSink,
+        streaming_config: StreamingConfig,
+        jobs: BackgroundJobQueue,
+        counter: KeywordCounter,
+        sender: MessageSender,
+        conversations: ConversationMemory | None = None,
     ):
         self.repo = repo
         self.chatgpt_service = chatgpt_service
         self.user_service = user_service
         self.event_service = event_service
+        self.rate_limiter = rate_limiter
+        self.log_sink = log_sink
+        self.streaming_config = streaming_config
+        self.jobs = jobs
+        self.counter = counter
+        self.sender = sender
+        self.conversations = conversations
         self.logger = logging.getLogger(__name__)
 
     def _check_rate_limit(self, username: str, cmd: str) -> bool:
-        return self.repo.check_rate_limit(username, cmd)
+        return self.rate_limiter.allow(username, cmd)
+
+    async def _log_request(self, username: str, command: str, success: bool) -> None:
+        await self.log_sink.submit(username, command, success)
 
-    def _log_request(self, username: str, command: str, success: bool) -> None:
-        self.repo.log_request(username, command, success)
+    async def _reply_with_completion(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        chat: Chat,
+        prompt: str,
+        messages: list[dict[str, str]] | None = None,
+    ) -> str:
+        if not self.streaming_config.enabled:
+            reply = await self.chatgpt_service.submit(prompt, messages=messages, similar=True)
+            await self.sender.send(chat.id, reply)
+            return reply
+
+        interval = self.streaming_config.edit_interval
+        if chat.type in ['group', 'supergroup']:
+            interval = self.streaming_config.group_edit_interval
+        message = ProgressiveMessage(self.sender, chat.id, interval)
+        await message.start()
+        async for chunk in self.chatgpt_service.stream(prompt, messages=messages, similar=True):
+            await message.append(chunk)
+        return await message.finish()
+
+    async def _run_in_background(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        key: str,
+        job: Callable[[], Awaitable[str]],
+        priority: Priority = Priority.NORMAL,
+    ) -> None:
+        chat_id = update.effective_chat.id
+
+        async def deliver() -> None:
+            try:
+                text = await job()
+            except Exception:
+                self.sender.post(chat_id, 'Sorry, something went wrong. Please try again later.', Priority.NORMAL)
+                raise  # logged and counted as failed by the job queue
+            self.sender.post(chat_id, text, Priority.NORMAL)
+
+        # Acknowledgements and results are only queued: waiting for delivery to a throttled chat would hold up the
+        # update handler and the job worker.
+        match self.jobs.submit(key, deliver, priority):
+            case Submission.DEDUPLICATED:
+                self.sender.post(chat_id, '⏳ Still working on your previous request.')
+            case Submission.REJECTED:
+                self.sender.post(chat_id, 'The bot is busy right now. Please try again shortly.')
+            case Submission.ACCEPTED:
+                self.sender.post(chat_id, '⏳ Working on it...')
 
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         query = update.callback_query
@@ -110,28 +189,28 @@ class TelegramCommandHandler:
 
         match type_:
             case Command.REGISTER:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text="Usage: /register <interests> [\"description\"] (e.g., \n/register gaming vr \"I enjoy FPS games\")",
+                await self.sender.send(
+                    chat_id,
+                    'Usage: /register <interests> ["description"] (e.g., \n/register gaming vr "I enjoy FPS games")',
                 )
             case Command.EVENTS:
                 await self.events(update, context)
             case Command.STORE:
-                await context.bot.send_message(chat_id=chat_id, text='Usage: /add <keyword>')
+                await self.sender.send(chat_id, 'Usage: /add <keyword>')
             case Command.OPENAI:
-                await context.bot.send_message(chat_id=chat_id, text='Usage: /openai <message>')
+                await self.sender.send(chat_id, 'Usage: /openai <message>')
             case Command.HELP:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text='Commands: /help, /add, /register, /events, /openai\n'
+                await self.sender.send(
+                    chat_id,
+                    'Commands: /help, /add, /register, /events, /openai\n'
                     'Example: /register gaming vr "I enjoy fast-paced shooter games"',
                 )
             case _:
-                await context.bot.send_message(chat_id=chat_id, text='⚠️ Unknown command. Please try again.')
+                await self.sender.send(chat_id, '⚠️ Unknown command. Please try again.')
 
-    @staticmethod
-    async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text(
+    async def start(self, update: Update, _: ContextTypes.DEFAULT_TYPE):
+        await self.sender.send(
+            update.effective_chat.id,
             (
                 f"👋 Hello, {update.effective_user.first_name}! \n"
                 f"I am your smart recommendation assistant. \n"
@@ -157,7 +236,8 @@ class TelegramCommandHandler:
     @before_request
     @after_request(Command.HELP)
     async def help(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-        await update.message.reply_text(
+        await self.sender.send(
+            update.effective_chat.id,
             'Commands: /help, /hello, /add, /register, /events, /more_events\n'
             "Example: /register gaming vr \"I enjoy fast-paced shooter games\""
         )
@@ -166,20 +246,19 @@ class TelegramCommandHandler:
     @after_request(Command.HELLO)
     async def hello(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         reply_message = ' '.join(context.args) if context.args else 'friend'
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=f'Good day, {reply_message}!')
+        await self.sender.send(update.effective_chat.id, f'Good day, {reply_message}!')
 
     @before_request
     @after_request(Command.OPENAI)
     async def openai(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if not context.args:
-            await update.message.reply_text('Usage: /openai <message>')
+            await self.sender.send(update.effective_chat.id, 'Usage: /openai <message>')
             return
 
         message = ' '.join(context.args)
         self.logger.info(f'OpenAI message: {message}')
-        reply = self.chatgpt_service.submit(message)
+        reply = await self._reply_with_completion(context, update.effective_chat, message)
         self.logger.info(f'OpenAI response: {reply}')
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=reply)
 
     @before_request
     @after_request(Command.STORE)
@@ -187,13 +266,13 @@ class TelegramCommandHandler:
         try:
             msg = context.args[0]
             self.logger.info(f'Incrementing count for: {msg}')
-            count = self.repo.incr(msg)
-            await update.message.reply_text(f'You have said {msg} for {count} times')
+            count = await self.counter.incr(msg)
+            await self.sender.send(update.effective_chat.id, f'You have said {msg} for {count} times')
         except IndexError:
-            await update.message.reply_text('Usage: /add <keyword>')
+            await self.sender.send(update.effective_chat.id, 'Usage: /add <keyword>')
         except Exception as e:
             self.logger.error(f'Error in add command: {e}')
-            await update.message.reply_text('An error occurred.')
+            await self.sender.send(update.effective_chat.id, 'An error occurred.')
 
     @before_request
     @after_request(Command.ADD_INTEREST)
@@ -202,12 +281,12 @@ class TelegramCommandHandler:
         username =user.username or str(user.id)
         
         if not context.args:
-            await update.message.reply_text('Usage: /add <interest>')
+            await self.sender.send(update.effective_chat.id, 'Usage: /add <interest>')
             return
         
         interests = context.args
-        self.user_service.add_interest(username, interests)
-        await update.message.reply_text(f'Added interest: {",".join(interests)}')
+        await self.user_service.add_interest(username, interests)
+        await self.sender.send(update.effective_chat.id, f'Added interest: {",".join(interests)}')
 
     @before_request
     @after_request(Command.REGISTER)
@@ -216,7 +295,8 @@ class TelegramCommandHandler:
         username = user.username or str(user.id)
 
         if not context.args:
-            await update.message.reply_text(
+            await self.sender.send(
+                update.effective_chat.id,
                 "Usage: /register <interests> [\"description\"] (e.g., /register gaming vr \"I enjoy FPS games\")"
             )
             return
@@ -236,21 +316,28 @@ class TelegramCommandHandler:
             interests.append(arg)
 
         if not interests:
-            await update.message.reply_text('Please provide at least one interest.')
+            await self.sender.send(update.effective_chat.id, 'Please provide at least one interest.')
             return
 
-        self.user_service.register_user(username, interests, description)
-        matches = self.user_service.find_matches(username)
-
-        response = f"Registered interests: {', '.join(interests)}"
-        if description:
-            response += f'\nDescription: {description}'
-        response += '\n'
-        if matches:
-            response += f"Matched users: {', '.join(matches)}"
-        else:
-            response += 'No matches found yet. Invite friends to join!'
-        await update.message.reply_text(response)
+        async def job() -> str:
+            # A user's private chat has the same id as the user, whichever chat they registered from.
+            await self.user_service.register_user(username, interests, description, user.id)
+            matches = await self.user_service.find_matches(username)
+
+            response = f"Registered interests: {', '.join(interests)}"
+            if description:
+                response += f'\nDescription: {description}'
+            response += '\n'
+            if matches:
+                response += f"Matched users: {', '.join(matches)}"
+                if self.user_service.matching_config.explain:
+                    explanation = await self.user_service.explain_matches(username, matches)
+                    response += f'\n{explanation}' if explanation else ''
+            else:
+                response += 'No matches found yet. Invite friends to join!'
+            return response
+
+        await self._run_in_background(update, context, f'register:{username}', job, Priority.NORMAL)
 
     @before_request
     @after_request(Command.EVENTS)
@@ -258,21 +345,23 @@ class TelegramCommandHandler:
         user = update.effective_user
         username = user.username or str(user.id)
 
-        user_profile = self.user_service.get_user(username)
+        user_profile = await self.user_service.get_user(username)
 
         if not user_profile or not user_profile.interests:
-            await update.message.reply_text('Please register your interests first with /register')
+            await self.sender.send(update.effective_chat.id, 'Please register your interests first with /register')
             return
 
-        events = self.event_service.recommend_events(user_profile)
-        if not events:
-            await update.message.reply_text("Sorry, I couldn't generate event recommendations right now.")
+        if events := await self.event_service.take_prefetched_events(user_profile):
+            await self.sender.send(update.effective_chat.id, format_events('Recommended Events:', events))
             return
 
-        response = ['Recommended Events:'] + [
-            f"{i}. {event.name} on {event.date} ({event.link})" for i, event in enumerate(events, 1)
-        ]
-        await context.bot.send_message(chat_id=update.effective_chat.id, text='\n'.join(response))
+        async def job() -> str:
+            events = await self.event_service.recommend_events(user_profile)
+            if not events:
+                return "Sorry, I couldn't generate event recommendations right now."
+            return format_events('Recommended Events:', events)
+
+        await self._run_in_background(update, context, f'events:{username}', job, Priority.HIGH)
 
     @before_request
     @after_request('more_events')
@@ -280,21 +369,20 @@ class TelegramCommandHandler:
         user = update.effective_user
         username = user.username or str(user.id)
 
-        user_profile = self.user_service.get_user(username)
+        user_profile = await self.user_service.get_user(username)
 
         if not user_profile or not user_profile.interests:
-            await update.message.reply_text('Please register your interests first with /register')
+            await self.sender.send(update.effective_chat.id, 'Please register your interests first with /register')
             return
 
-        events = self.event_service.recommend_more_events(user_profile)
+        events = await self.event_service.recommend_more_events(user_profile)
         if not events:
-            await update.message.reply_text("Sorry, I couldn't generate more event recommendations right now.")
+            await self.sender.send(
+                update.effective_chat.id, "Sorry, I couldn't generate more event recommendations right now."
+            )
             return
 
-        response = ['More Recommended Events:'] + [
-            f"{i}. {event.name} on {event.date} ({event.link})" for i, event in enumerate(events, 1)
-        ]
-        await update.message.reply_text('\n'.join(response))
+        await self.sender.send(update.effective_chat.id, format_events('More Recommended Events:', events))
 
     @before_request
     @after_request(Command.MESSAGE)
@@ -305,6 +393,8 @@ class TelegramCommandHandler:
             if f"@{bot_username}" not in message.text:
                 return
 
-        reply = self.chatgpt_service.submit(message.text)
+        messages = self.conversations.prompt(message.chat.id, message.text) if self.conversations else None
+        reply = await self._reply_with_completion(context, message.chat, message.text, messages)
+        if self.conversations and not reply.startswith('Error:'):
+            self.conversations.record(message.chat.id, message.text, reply)
         self.logger.info(f'ChatGPT response: {reply}')
-        await context.bot.send_message(chat_id=message.chat.id, text=reply)
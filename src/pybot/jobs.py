@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import logging
+from contextlib import suppress
+from dataclasses import dataclass, field
+from enum import Enum, IntEnum
+from typing import Awaitable, Callable
+
+from telegram.ext import ContextTypes, JobQueue
+
+from pybot.metrics import metrics
+from pybot.setting import WorkerConfig
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class Submission(Enum):
+    ACCEPTED = 'accepted'
+    DEDUPLICATED = 'deduplicated'
+    REJECTED = 'rejected'
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    sequence: int
+    key: str = field(compare=False)
+    run: Callable[[], Awaitable[None]] = field(compare=False)
+
+
+class BackgroundJobQueue:
+    """Priority queue of slow jobs drained by a fixed pool of worker tasks.
+
+    Jobs are deduplicated by key while queued or running, so repeated taps from one user collapse into a single
+    job. Queue-depth metrics are reported through the application's ``JobQueue``.
+    """
+
+    def __init__(self, config: WorkerConfig):
+        self.config = config
+        self.queue: asyncio.PriorityQueue[_Job] = asyncio.PriorityQueue(maxsize=config.max_depth)
+        self.logger = logging.getLogger(__name__)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self._active: set[str] = set()
+        self._sequence = itertools.count()
+        self._workers: list[asyncio.Task[None]] = []
+
+    def start(self, job_queue: JobQueue | None = None) -> None:
+        self._workers = [
+            asyncio.create_task(self._work(), name=f'background-worker-{i}') for i in range(self.config.concurrency)
+        ]
+        if job_queue is not None:
+            job_queue.run_repeating(self._report, interval=self.config.metrics_interval, name='background-job-metrics')
+
+    def submit(self, key: str, run: Callable[[], Awaitable[None]], priority: Priority = Priority.NORMAL) -> Submission:
+        if key in self._active:
+            self.deduplicated += 1
+            return Submission.DEDUPLICATED
+        try:
+            self.queue.put_nowait(_Job(priority, next(self._sequence), key, run))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return Submission.REJECTED
+
+        self._active.add(key)
+        self.submitted += 1
+        return Submission.ACCEPTED
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            'depth': self.queue.qsize(),
+            'active': len(self._active),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'deduplicated': self.deduplicated,
+            'rejected': self.rejected,
+        }
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                with metrics.request(f"job:{job.key.partition(':')[0]}"):
+                    await job.run()
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f'Background job {job.key} failed: {e}')
+            finally:
+                self._active.discard(job.key)
+                self.queue.task_done()
+
+    async def _report(self, _: ContextTypes.DEFAULT_TYPE) -> None:
+        self.logger.info(f'Background jobs: {self.metrics()}')
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import UTC, datetime
+
+from pybot.async_repository import AsyncRepository
+from pybot.model import RequestLog
+from pybot.setting import LogSinkConfig
+
+
+class RequestLogSink:
+    """Buffers request logs in a bounded queue and writes them to the repository in batches.
+
+    A batch is flushed once it holds ``batch_size`` records or ``flush_interval`` seconds after its first record,
+    whichever comes first. When the queue is full, ``submit`` waits up to ``put_timeout`` for the flusher to catch up
+    and then drops the record rather than stalling the handler.
+    """
+
+    def __init__(self, repo: AsyncRepository, config: LogSinkConfig):
+        self.repo = repo
+        self.config = config
+        self.queue: asyncio.Queue[RequestLog] = asyncio.Queue(maxsize=config.max_queue_size)
+        self.dropped = 0
+        self.logger = logging.getLogger(__name__)
+        self._pending: list[RequestLog] = []
+        self._task: asyncio.Task[None] | None = None
+        self._closing = False
+        self._writing = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='request-log-sink')
+
+    async def submit(self, username: str, command: str, success: bool) -> None:
+        record = RequestLog(username=username, command=command, success=success, timestamp=datetime.now(UTC))
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(record), self.config.put_timeout)
+            except TimeoutError:
+                self.dropped += 1
+                self.logger.warning(f'Request log queue full, dropped {self.dropped} records so far')
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # A batch already taken off the queue is left to finish writing; cancelling the write would lose it.
+            self._closing = True
+            if not self._writing:
+                self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        while not self.queue.empty():
+            self._pending.append(self.queue.get_nowait())
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.config.batch_size):
+            await self._flush(pending[start : start + self.config.batch_size])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            self._pending.append(await self.queue.get())
+            deadline = loop.time() + self.config.flush_interval
+            while len(self._pending) < self.config.batch_size:
+                if not self.queue.empty():
+                    self._pending.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            batch, self._pending = self._pending, []
+            self._writing = True
+            try:
+                await self._flush(batch)
+            finally:
+                self._writing = False
+
+    async def _flush(self, batch: list[RequestLog]) -> None:
+        try:
+            await self.repo.log_requests(batch)
+        except Exception as e:
+            self.logger.error(f'Failed to write {len(batch)} request logs: {e}')
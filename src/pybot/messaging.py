@@ -0,0 +1,340 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+
+from telegram import Bot, Message
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.request import HTTPXRequest
+
+from pybot.cache import TTLCache
+from pybot.jobs import Priority
+from pybot.metrics import metrics
+from pybot.model import Event
+from pybot.ratelimit import TokenBucket
+from pybot.resilience import backoff_delay
+from pybot.setting import SenderConfig
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = text.rfind(' ', 0, limit)
+        if cut <= 0:
+            parts.append(text[:limit])
+            text = text[limit:]
+        else:
+            parts.append(text[:cut])
+            text = text[cut + 1 :]
+    parts.append(text)
+    return parts
+
+
+def format_events(title: str, events: list[Event]) -> str:
+    response = [title] + [f"{i}. {event.name} on {event.date} ({event.link})" for i, event in enumerate(events, 1)]
+    return '\n'.join(response)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """Bot API transport that records every call as a ``telegram`` span named after the API method."""
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> tuple[int, bytes]:
+        with metrics.span('telegram', url.rsplit('/', 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+@dataclass
+class _Outgoing:
+    priority: Priority
+    call: Callable[[Bot], Awaitable[Any]]
+    retry: bool
+    future: asyncio.Future[Any]
+    attempts: int = 0
+
+
+class _PriorityGate:
+    """Global token bucket whose waiters are let through in priority order, then in arrival order."""
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._sequence = itertools.count()
+        self._pump: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: Priority) -> None:
+        if not self._waiters and self.bucket.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._release(), name='send-gate')
+        await future
+
+    async def _release(self) -> None:
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            elif self.bucket.try_acquire():
+                heapq.heappop(self._waiters)[2].set_result(None)
+            else:
+                await asyncio.sleep(self.bucket.delay())
+
+    def close(self) -> None:
+        if self._pump is not None:
+            self._pump.cancel()
+
+
+class MessageSender:
+    """Outbound queue between the handlers and the Bot API that keeps within Telegram's flood limits.
+
+    Every call spends a token from its chat's bucket (stricter for groups) and then from a global bucket. Waiting for
+    the global bucket is ordered by lane: interactive replies (``Priority.HIGH``) go before deferred job results and
+    background pushes (``Priority.LOW``). Each chat is drained in order by its own task, so a throttled chat never
+    holds up the others' queues. ``RetryAfter`` is waited out and the call retried; texts over 4096 characters are
+    split. ``send`` waits for delivery; ``post`` only queues, for callers that must not wait on a throttled chat.
+    """
+
+    def __init__(self, config: SenderConfig, bot: Bot | None = None):
+        self.config = config
+        self.bot = bot
+        self.logger = logging.getLogger(__name__)
+        self.sent = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self.failed = 0
+        self._gate = _PriorityGate(config.global_rate, config.global_burst)
+        self._buckets: TTLCache[int, TokenBucket] = TTLCache(config.max_chats, config.bucket_ttl)
+        self._queues: dict[int, deque[_Outgoing]] = {}
+        self._workers: dict[int, asyncio.Task[None]] = {}
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+
+    async def send(
+        self,
+        chat_id: int,
+        text: str,
+        priority: Priority = Priority.HIGH,
+        retry: bool = True,
+        **kwargs: Any,
+    ) -> list[Message]:
+        """Sends ``text`` in as many messages as it takes; ``kwargs`` (e.g. ``reply_markup``) go with the last one."""
+        futures = self._enqueue_text(chat_id, text, priority, retry, kwargs)
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results  # type: ignore[return-value]
+
+    def post(self, chat_id: int, text: str, priority: Priority = Priority.HIGH, **kwargs: Any) -> None:
+        """Queues ``text`` like ``send`` without waiting for delivery; failures are counted and logged."""
+        for future in self._enqueue_text(chat_id, text, priority, True, kwargs):
+            future.add_done_callback(lambda done: self._log_failure(chat_id, done))
+
+    async def edit(
+        self,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        priority: Priority = Priority.HIGH,
+        retry: bool = True,
+    ) -> Any:
+        async def call(bot: Bot) -> Any:
+            return await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+
+        return await self._enqueue(chat_id, call, priority, retry)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'chats': len(self._queues),
+            'gate_waiting': len(self._gate),
+            'sent': self.sent,
+            'retried': self.retried,
+            'flood_waits': self.flood_waits,
+            'failed': self.failed,
+        }
+
+    async def close(self) -> None:
+        self._gate.close()
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def _enqueue_text(
+        self,
+        chat_id: int,
+        text: str,
+        priority: Priority,
+        retry: bool,
+        kwargs: dict[str, Any],
+    ) -> list[asyncio.Future[Any]]:
+        parts = split_text(text)
+        futures = []
+        for i, part in enumerate(parts):
+            extra = kwargs if i == len(parts) - 1 else {}
+
+            async def call(bot: Bot, part: str = part, extra: dict[str, Any] = extra) -> Message:
+                return await bot.send_message(chat_id=chat_id, text=part, **extra)
+
+            futures.append(self._enqueue(chat_id, call, priority, retry))
+        return futures
+
+    def _enqueue(
+        self,
+        chat_id: int,
+        call: Callable[[Bot], Awaitable[Any]],
+        priority: Priority,
+        retry: bool,
+    ) -> asyncio.Future[Any]:
+        item = _Outgoing(priority, call, retry, asyncio.get_running_loop().create_future())
+        queue = self._queues.setdefault(chat_id, deque())
+        # Within a chat, a message only overtakes queued messages of a lower lane, never the one being sent.
+        index = len(queue)
+        while index > 1 and queue[index - 1].priority > priority:
+            index -= 1
+        queue.insert(index, item)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._drain(chat_id, queue), name=f'send-{chat_id}')
+        return item.future
+
+    def _log_failure(self, chat_id: int, future: asyncio.Future[Any]) -> None:
+        if not future.cancelled() and (error := future.exception()) is not None:
+            self.logger.warning(f'Message to chat {chat_id} failed: {error}')
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Negative ids are groups, supergroups and channels.
+            if chat_id < 0:
+                bucket = TokenBucket(self.config.group_rate, self.config.group_burst)
+            else:
+                bucket = TokenBucket(self.config.chat_rate, self.config.chat_burst)
+            self._buckets.set(chat_id, bucket)
+        return bucket
+
+    async def _drain(self, chat_id: int, queue: deque[_Outgoing]) -> None:
+        try:
+            while queue:
+                item = queue[0]
+                if item.future.done():
+                    queue.popleft()
+                    continue
+                bucket = self._bucket(chat_id)
+                while not bucket.try_acquire():
+                    await asyncio.sleep(bucket.delay())
+                await self._gate.acquire(item.priority)
+                try:
+                    result = await item.call(self.bot)  # type: ignore[arg-type]
+                except RetryAfter as e:
+                    self.flood_waits += 1
+                    if self._retry(item):
+                        await asyncio.sleep(retry_after_seconds(e))
+                    else:
+                        self._fail(queue, e)
+                except (BadRequest, TimedOut) as e:
+                    # Not retried: a bad request will fail again, and a timed-out message may have been delivered.
+                    self._fail(queue, e)
+                except NetworkError as e:
+                    if self._retry(item):
+                        await asyncio.sleep(backoff_delay(item.attempts, 0.5, 10))
+                    else:
+                        self._fail(queue, e)
+                except Exception as e:
+                    self._fail(queue, e)
+                else:
+                    queue.popleft()
+                    self.sent += 1
+                    if not item.future.done():
+                        item.future.set_result(result)
+        finally:
+            for item in queue:
+                item.future.cancel()
+            del self._queues[chat_id]
+            del self._workers[chat_id]
+
+    def _retry(self, item: _Outgoing) -> bool:
+        if not item.retry or item.attempts >= self.config.max_retries:
+            return False
+        item.attempts += 1
+        self.retried += 1
+        return True
+
+    def _fail(self, queue: deque[_Outgoing], error: Exception) -> None:
+        item = queue.popleft()
+        self.failed += 1
+        if not item.future.done():
+            item.future.set_exception(error)
+
+
+class ProgressiveMessage:
+    """Shows a reply while it is being generated by editing a placeholder message at most every ``edit_interval``.
+
+    Text beyond Telegram's 4096-character cap continues in follow-up messages. Intermediate edits are skipped when
+    Telegram asks us to back off; only ``finish`` waits out a flood limit so the final text is always delivered.
+    Sends and edits go through ``sender`` without its retries, so the flood handling here stays in charge.
+    """
+
+    def __init__(self, sender: MessageSender, chat_id: int, edit_interval: float = 1.0, placeholder: str = '…'):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.placeholder = placeholder
+        self.text = ''
+        self._messages: list[Message] = []
+        self._shown: list[str] = []
+        self._next_edit = 0.0
+
+    async def start(self) -> None:
+        self._messages += await self.sender.send(self.chat_id, self.placeholder, retry=False)
+        self._shown.append(self.placeholder)
+        self._next_edit = time.monotonic() + self.edit_interval
+
+    async def append(self, chunk: str) -> None:
+        self.text += chunk
+        if time.monotonic() >= self._next_edit:
+            try:
+                await self._sync()
+            except RetryAfter as e:
+                self._next_edit = time.monotonic() + retry_after_seconds(e)
+
+    async def finish(self) -> str:
+        while True:
+            try:
+                await self._sync()
+                return self.text
+            except RetryAfter as e:
+                await asyncio.sleep(retry_after_seconds(e))
+
+    async def _sync(self) -> None:
+        parts = split_text(self.text) if self.text.strip() else [self.placeholder]
+        for i, part in enumerate(parts):
+            if i >= len(self._messages):
+                self._messages += await self.sender.send(self.chat_id, part, retry=False)
+                self._shown.append(part)
+            elif self._shown[i] != part:
+                try:
+                    await self.sender.edit(self.chat_id, self._messages[i].message_id, part, retry=False)
+                except BadRequest as e:
+                    if 'not modified' not in str(e).lower():
+                        raise
+                self._shown[i] = part
+        self._next_edit = time.monotonic() + self.edit_interval
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from pybot.setting import MetricsConfig
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+@dataclass
+class _Series:
+    buckets: list[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in the Prometheus text exposition format."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...],
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], _Series] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series([0] * (len(self.buckets) + 1))
+        series.buckets[bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def totals(self) -> dict[tuple[str, ...], tuple[int, float]]:
+        return {labels: (series.count, series.total) for labels, series in self._series.items()}
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*map(str, self.buckets), '+Inf'), series.buckets):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series.total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series.count}')
+        return lines
+
+
+@dataclass
+class RequestTrace:
+    handler: str
+    start: float
+    duration: float = 0.0
+    phases: dict[str, float] = field(default_factory=dict)
+
+
+_current_request: ContextVar[RequestTrace | None] = ContextVar('current_request', default=None)
+
+
+class StackSampler:
+    """Samples the event loop thread's stack from a daemon thread, so slow requests can report where the loop was busy.
+
+    Samples taken while the loop is idle in ``select`` are dropped.
+    """
+
+    def __init__(self, interval: float = 0.01, depth: int = 12, max_samples: int = 10000):
+        self.interval = interval
+        self.depth = depth
+        self._samples: deque[tuple[float, tuple[str, ...]]] = deque(maxlen=max_samples)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, thread_id: int) -> None:
+        self._thread = threading.Thread(target=self._run, args=(thread_id,), name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def hot_stacks(self, start: float, end: float, limit: int = 3) -> list[tuple[int, tuple[str, ...]]]:
+        stacks = Counter(stack for taken, stack in list(self._samples) if start <= taken <= end)
+        return [(count, stack) for stack, count in stacks.most_common(limit)]
+
+    def _run(self, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None or frame.f_code.co_name == 'select':
+                continue
+            stack: list[str] = []
+            while frame is not None and len(stack) < self.depth:
+                stack.append(f'{frame.f_code.co_filename}:{frame.f_lineno} {frame.f_code.co_name}')
+                frame = frame.f_back
+            self._samples.append((time.perf_counter(), tuple(stack)))
+
+
+class MetricsRegistry:
+    """Process-wide timing spans and histograms.
+
+    ``request`` opens a trace for one handler invocation; ``span`` records a phase (rate limit, repository, LLM,
+    Telegram) against the current trace and the ``pybot_phase_seconds`` histogram. Requests slower than the
+    configured threshold are passed to ``slow_request_hooks``.
+    """
+
+    def __init__(self):
+        self.handler_seconds = Histogram('pybot_handler_seconds', 'Handler latency.', ('handler',))
+        self.phase_seconds = Histogram(
+            'pybot_phase_seconds', 'Time spent per handler phase.', ('handler', 'phase', 'operation')
+        )
+        self.collectors: dict[str, Callable[[], dict[str, float]]] = {}
+        self.slow_request_threshold = 0.0
+        self.slow_request_hooks: list[Callable[[RequestTrace], None]] = [self._log_slow_request]
+        self.sampler: StackSampler | None = None
+
+    def configure(self, config: MetricsConfig) -> None:
+        """Applies ``config``; must run on the event loop thread so the profiler samples the right stack."""
+        self.slow_request_threshold = config.slow_request_threshold
+        if config.profile_slow_requests and self.sampler is None:
+            self.sampler = StackSampler(config.profile_interval)
+            self.sampler.start(threading.get_ident())
+            self.slow_request_hooks.append(self._log_hot_stacks)
+
+    def close(self) -> None:
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.slow_request_hooks.remove(self._log_hot_stacks)
+            self.sampler = None
+
+    def register_collector(self, name: str, collect: Callable[[], dict[str, float]]) -> None:
+        self.collectors[name] = collect
+
+    @contextmanager
+    def request(self, handler: str) -> Iterator[RequestTrace]:
+        trace = RequestTrace(handler, time.perf_counter())
+        token = _current_request.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_request.reset(token)
+            trace.duration = time.perf_counter() - trace.start
+            self.handler_seconds.observe(trace.duration, handler)
+            if self.slow_request_threshold and trace.duration >= self.slow_request_threshold:
+                for hook in self.slow_request_hooks:
+                    hook(trace)
+
+    @contextmanager
+    def span(self, phase: str, operation: str = '') -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, operation, time.perf_counter() - start)
+
+    def record(self, phase: str, operation: str, seconds: float) -> None:
+        trace = _current_request.get()
+        self.phase_seconds.observe(seconds, trace.handler if trace else '', phase, operation)
+        if trace is not None:
+            trace.phases[phase] = trace.phases.get(phase, 0.0) + seconds
+
+    def render(self) -> str:
+        lines = self.handler_seconds.render() + self.phase_seconds.render()
+        for name, collect in self.collectors.items():
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f'Metrics collector {name} failed: {e}')
+                continue
+            for key, value in values.items():
+                lines.append(f'# TYPE pybot_{name}_{key} gauge')
+                lines.append(f'pybot_{name}_{key} {float(value)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _log_slow_request(trace: RequestTrace) -> None:
+        phases = ', '.join(f'{phase}={seconds * 1000:.0f}ms' for phase, seconds in trace.phases.items())
+        logger.warning(f'Slow request {trace.handler}: {trace.duration * 1000:.0f}ms ({phases or "no spans"})')
+
+    def _log_hot_stacks(self, trace: RequestTrace) -> None:
+        if self.sampler is None:
+            return
+        for count, stack in self.sampler.hot_stacks(trace.start, trace.start + trace.duration):
+            logger.warning(f'Busy loop during {trace.handler} ({count} samples):\n  ' + '\n  '.join(stack))
+
+
+class MetricsServer:
+    """Minimal HTTP server answering ``GET /metrics``; it runs on its own port beside the webhook server."""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[0] == b'GET' and parts[1].split(b'?')[0] == b'/metrics':
+                status, body = '200 OK', self.registry.render().encode()
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1 @@
+"""One-off data migrations, run as ``python -m pybot.migrations.<name>``."""
@@ -0,0 +1,125 @@
+import argparse
+import json
+import logging
+from collections import deque
+from typing import Any
+
+from google.cloud.firestore import DocumentReference, Transaction
+
+from pybot.bloom import normalize_name
+from pybot.repository import FirebaseRepository
+
+logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _identity(event: dict[str, Any]) -> tuple[str, str, str]:
+    return event['name'], event['date'], event['link']
+
+
+class PastEventsMigration:
+    """Folds the legacy one-document-per-event ``past_events`` collection into capped ``event_history`` documents.
+
+    The source is streamed ordered by (user, timestamp), which needs the composite index declared in
+    ``firestore.indexes.json``; only one user's most recent ``history_limit`` events are held in memory at a time.
+    Events already written in the new format are merged transactionally and duplicates are skipped, so the migration
+    can run while the bot is live and can be re-run. With ``delete``, a user's source documents are removed only once
+    their merge has committed, so an interrupted run never loses history.
+    """
+
+    def __init__(self, repo: FirebaseRepository, dry_run: bool = False, delete: bool = False):
+        self.repo = repo
+        self.dry_run = dry_run
+        self.delete = delete
+        self.stats = {'users': 0, 'events': 0, 'duplicates': 0, 'deleted': 0}
+        self._stale: list[DocumentReference] = []
+
+    def run(self) -> dict[str, int]:
+        query = self.repo.past_events.order_by('user').order_by('timestamp')
+        username = None
+        events: deque[dict[str, Any]] = deque(maxlen=self.repo.history_limit)
+        for doc in query.stream():
+            data = doc.to_dict() or {}
+            if data['user'] != username:
+                self._write(username, events)
+                self._delete_stale()
+                username, events = data['user'], deque(maxlen=self.repo.history_limit)
+
+            events.append({**json.loads(data['content']), 'timestamp': data['timestamp']})
+            self.stats['events'] += 1
+            self._mark_stale(doc.reference)
+
+        self._write(username, events)
+        self._delete_stale()
+        return self.stats
+
+    def _write(self, username: str | None, events: deque[dict[str, Any]]) -> None:
+        if username is None or not events:
+            return
+
+        self.stats['users'] += 1
+        if self.dry_run:
+            return
+
+        from firebase_admin import firestore
+
+        ref = self.repo.event_history.document(username)
+
+        # Read-modify-write in a transaction, as ``save_events`` does, so an event the bot saves meanwhile is not
+        # overwritten. Events already in the history are skipped, which makes re-running the migration safe.
+        @firestore.transactional
+        def merge(transaction: Transaction) -> None:
+            data = ref.get(transaction=transaction).to_dict() or {}
+            history = data.get('events', [])
+            known = {_identity(event) for event in history}
+            seen = self.repo.new_event_filter(data.get('seen'))
+            added = 0
+            for event in events:
+                if _identity(event) in known:
+                    continue
+                known.add(_identity(event))
+                history.append(event)
+                seen.add(normalize_name(event['name']))
+                added += 1
+            self.stats['duplicates'] += len(events) - added
+            if not added:
+                return
+            history = sorted(history, key=lambda event: event['timestamp'])[-self.repo.history_limit :]
+            transaction.set(ref, {'events': history, 'seen': seen.to_bytes(), 'updated': history[-1]['timestamp']})
+
+        merge(self.repo.db.transaction())
+
+    def _mark_stale(self, ref: DocumentReference) -> None:
+        if not self.delete:
+            return
+        self._stale.append(ref)
+
+    def _delete_stale(self) -> None:
+        # Called only after ``_write`` has committed the user these documents belong to.
+        if not self._stale:
+            return
+        if not self.dry_run:
+            for start in range(0, len(self._stale), self.repo.max_batch_writes):
+                batch = self.repo.db.batch()
+                for ref in self._stale[start : start + self.repo.max_batch_writes]:
+                    batch.delete(ref)
+                batch.commit()
+        self.stats['deleted'] += len(self._stale)
+        self._stale = []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Migrate past_events documents into per-user event_history.')
+    parser.add_argument('--dry-run', action='store_true', help='read and report without writing anything')
+    parser.add_argument('--delete', action='store_true', help='delete migrated past_events documents')
+    args = parser.parse_args()
+
+    stats = PastEventsMigration(FirebaseRepository(), dry_run=args.dry_run, delete=args.delete).run()
+    logger.info(
+        f'Migrated {stats["events"]} events for {stats["users"]} users ({stats["duplicates"]} already present), '
+        f'deleted {stats["deleted"]} documents'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import StrEnum
 
 from pydantic import BaseModel
@@ -7,6 +8,8 @@ class UserProfile(BaseModel):
     username: str
     interests: set[str]
     description: str = ''
+    # Private chat with the user, for messages the bot sends on its own (e.g. the daily digest).
+    chat_id: int | None = None
 
 
 class Event(BaseModel):
@@ -15,6 +18,13 @@ class Event(BaseModel):
     link: str
 
 
+class RequestLog(BaseModel):
+    username: str
+    command: str
+    success: bool
+    timestamp: datetime
+
+
 class Command(StrEnum):
     START = 'start'
     HELP = 'help'
@@ -0,0 +1,110 @@
+import time
+from dataclasses import dataclass
+from typing import Protocol
+
+from pybot.setting import RateLimitConfig
+
+
+class RateLimitStore(Protocol):
+    async def exchange(self, window: int, deltas: dict[str, int]) -> dict[str, int]:
+        """Adds ``deltas`` to the shared counters of ``window`` and returns the resulting totals per key."""
+        ...
+
+
+@dataclass
+class _Window:
+    index: int
+    count: int = 0
+    previous: int = 0
+    remote: int = 0
+    unsynced: int = 0
+
+
+class SlidingWindowRateLimiter:
+    """Sliding-window counter per (username, command), kept entirely in memory.
+
+    The previous fixed window's count is weighted by how much of it still overlaps the sliding window, which gives
+    a smooth limit with O(1) state per key. When a ``RateLimitStore`` is attached, ``sync`` exchanges local hits
+    with other replicas so the limit holds across processes, without putting the store on the request path. Windows
+    are numbered from wall-clock time, so every replica agrees on which window a hit belongs to.
+    """
+
+    def __init__(self, config: RateLimitConfig, store: RateLimitStore | None = None):
+        self.config = config
+        self.store = store
+        self._windows: dict[str, _Window] = {}
+        self._last_prune = time.monotonic()
+
+    def quota(self, cmd: str) -> int:
+        return self.config.quotas.get(cmd, self.config.default_quota)
+
+    def allow(self, username: str, cmd: str) -> bool:
+        index, elapsed = divmod(time.time(), self.config.window)
+        key = f'{username}:{cmd}'
+        window = self._roll(key, int(index))
+
+        weight = 1 - elapsed / self.config.window
+        estimate = window.previous * weight + window.count + window.remote
+        if estimate >= self.quota(cmd):
+            return False
+
+        window.count += 1
+        window.unsynced += 1
+        now = time.monotonic()
+        if now - self._last_prune > self.config.window:
+            self._prune(int(index))
+            self._last_prune = now
+        return True
+
+    async def sync(self) -> None:
+        if self.store is None:
+            return
+
+        index = int(time.time() // self.config.window)
+        deltas = {}
+        for key, window in self._windows.items():
+            if window.index == index and window.unsynced:
+                deltas[key] = window.unsynced
+                window.unsynced = 0
+
+        totals = await self.store.exchange(index, deltas)
+        for key, total in totals.items():
+            window = self._roll(key, index)
+            window.remote = max(total - window.count, 0)
+
+    def _roll(self, key: str, index: int) -> _Window:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window(index)
+        elif window.index != index:
+            total = window.count + window.remote
+            window.previous = total if window.index == index - 1 else 0
+            window.index, window.count, window.remote, window.unsynced = index, 0, 0, 0
+        return window
+
+    def _prune(self, index: int) -> None:
+        stale = [key for key, window in self._windows.items() if window.index < index - 1]
+        for key in stale:
+            del self._windows[key]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds until ``tokens`` would be available, without consuming anything."""
+        missing = tokens - min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+        return max(missing / self.rate, 0.0) if self.rate else float('inf')
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from typing import Callable, Generic, TypeVar
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from pybot.cache import TTLCache
+from pybot.counter import CounterStore
+from pybot.setting import RedisConfig
+
+V = TypeVar('V')
+
+# Adds this replica's hits to the window's hash and returns every total in it, in one atomic round trip.
+_EXCHANGE_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+
+def create_redis(config: RedisConfig) -> Redis:
+    return Redis(
+        host=config.host,
+        port=config.port,
+        username=config.username,
+        password=config.password,
+        ssl=config.ssl,
+        decode_responses=True,
+    )
+
+
+class RedisRateLimitStore:
+    """``RateLimitStore`` that shares sliding-window counts between replicas through one Redis hash per window.
+
+    The hash outlives its window by one more window, because the limiter still weighs the previous window's total.
+    """
+
+    def __init__(self, client: Redis, window: int, prefix: str = 'pybot'):
+        self.client = client
+        self.window = window
+        self.prefix = prefix
+        self._exchange = client.register_script(_EXCHANGE_SCRIPT)
+
+    async def exchange(self, window: int, deltas: dict[str, int]) -> dict[str, int]:
+        args: list[str | int] = [self.window * 2]
+        for key, delta in deltas.items():
+            args.extend((key, delta))
+        flat = await self._exchange(keys=[f'{self.prefix}:ratelimit:{window}'], args=args)
+        return {flat[i]: int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+
+class RedisCounterStore:
+    """Keyword counters kept as plain Redis integers; ``incr_many`` flushes a batch in a single transaction.
+
+    Counts from before Redis was enabled stay in ``seed`` (the repository): a key Redis has not seen yet is set from
+    there, only if still absent, before its first increment, so enabling Redis does not reset any count.
+    """
+
+    def __init__(self, client: Redis, seed: CounterStore, prefix: str = 'pybot', maxsize: int = 10000):
+        self.client = client
+        self.seed = seed
+        self.prefix = prefix
+        self._seeded: TTLCache[str, bool] = TTLCache(maxsize, ttl=float('inf'))
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:counter:{key}'
+
+    async def _seed_missing(self, keys: list[str]) -> None:
+        keys = [key for key in keys if self._seeded.get(key) is None]
+        if not keys:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.exists(self._key(key))
+            found = await pipe.execute()
+        if missing := [key for key, exists in zip(keys, found) if not exists]:
+            counts = await asyncio.gather(*(self.seed.get_count(key) for key in missing))
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, count in zip(missing, counts):
+                    pipe.set(self._key(key), count, nx=True)
+                await pipe.execute()
+        for key in keys:
+            self._seeded.set(key, True)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        await self._seed_missing([key])
+        return await self.client.incrby(self._key(key), amount)
+
+    async def incr_many(self, deltas: dict[str, int]) -> dict[str, int]:
+        # MULTI/EXEC, so a batch cut off by a connection error is not partly applied; errors reach the caller, which
+        # keeps the deltas for the next flush.
+        await self._seed_missing(list(deltas))
+        async with self.client.pipeline(transaction=True) as pipe:
+            for key, amount in deltas.items():
+                pipe.incrby(self._key(key), amount)
+            totals = await pipe.execute()
+        return dict(zip(deltas, totals))
+
+    async def get_count(self, key: str) -> int:
+        await self._seed_missing([key])
+        return int(await self.client.get(self._key(key)) or 0)
+
+
+class RedisCache(Generic[V]):
+    """Shared cache tier in front of the repository; values are serialized with ``dumps``/``loads`` and expire after
+    ``ttl`` seconds. Redis errors degrade to cache misses so an outage only costs repository reads.
+    """
+
+    def __init__(
+        self,
+        client: Redis,
+        namespace: str,
+        ttl: float,
+        dumps: Callable[[V], str],
+        loads: Callable[[str], V],
+        prefix: str = 'pybot',
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.logger = logging.getLogger(__name__)
+        self._prefix = f'{prefix}:{namespace}:'
+
+    async def get(self, key: str) -> V | None:
+        try:
+            value = await self.client.get(self._prefix + key)
+        except RedisError as e:
+            self.logger.warning(f'Shared cache read failed for {key}: {e}')
+            return None
+        return self.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: V) -> None:
+        try:
+            await self.client.set(self._prefix + key, self.dumps(value), px=int(self.ttl * 1000))
+        except RedisError as e:
+            self.logger.warning(f'Shared cache write failed for {key}: {e}')
+
+    async def pop(self, key: str) -> None:
+        try:
+            await self.client.delete(self._prefix + key)
+        except RedisError as e:
+            self.logger.warning(f'Shared cache delete failed for {key}: {e}')
@@ -1,73 +1,170 @@
-import json
 import os
+import random
 import tempfile
-from dataclasses import dataclass
-from datetime import UTC, datetime, timedelta
+import threading
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-from google.cloud.firestore import Increment
-from google.cloud.firestore_v1.base_query import FieldFilter
+from pybot.bloom import BloomFilter, normalize_name
+from pybot.model import Event, RequestLog, UserProfile
 
-from pybot.model import Event, UserProfile
+if TYPE_CHECKING:
+    from google.cloud.firestore import Client, CollectionReference, Transaction
 
 
 @dataclass
 class FirebaseRepository:
+    """Firestore storage backend.
+
+    The Firebase SDK and its gRPC channel are heavy to import and open, so both happen on first use (or in
+    ``warm_up``) rather than at construction; only the credentials are checked up front.
+    """
+
+    max_batch_writes: int = 500
+    counter_shards: int = 1
+    history_limit: int = 60
+    bloom_bits: int = 8192
+    bloom_hashes: int = 6
+    _db: 'Client | None' = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
 
     def __post_init__(self):
-        cred_json = os.environ.get('GOOGLE_CREDENTIALS')
-        if not cred_json:
+        self.cred_json = os.environ.get('GOOGLE_CREDENTIALS')
+        if not self.cred_json:
             raise RuntimeError('Missing GOOGLE_CREDENTIALS env var')
 
+    @property
+    def db(self) -> 'Client':
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._connect()
+        return self._db
+
+    def _connect(self) -> 'Client':
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as tmp:
-            tmp.write(cred_json)
+            tmp.write(self.cred_json)
             cred_path = tmp.name
 
         firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        return firestore.client()
+
+    def warm_up(self) -> None:
+        # Opens the gRPC channel with a cheap read so the first request does not pay for the handshake.
+        list(self.users.limit(1).stream())
+
+    @property
+    def users(self) -> 'CollectionReference':
+        return self.db.collection('users')
+
+    @property
+    def rate_limits(self) -> 'CollectionReference':
+        return self.db.collection('rate_limits')
+
+    @property
+    def request_logs(self) -> 'CollectionReference':
+        return self.db.collection('request_logs')
+
+    @property
+    def past_events(self) -> 'CollectionReference':
+        return self.db.collection('past_events')
 
-        self.db = firestore.client()
-        self.users = self.db.collection('users')
-        self.rate_limits = self.db.collection('rate_limits')
-        self.request_logs = self.db.collection('request_logs')
-        self.past_events = self.db.collection('past_events')
+    @property
+    def event_history(self) -> 'CollectionReference':
+        return self.db.collection('event_history')
+
+    @property
+    def checkpoints(self) -> 'CollectionReference':
+        return self.db.collection('checkpoints')
 
     def save_user(self, user: UserProfile) -> None:
-        self.users.document(user.username).set(user.model_dump())
+        self.users.document(user.username).set(user.model_dump(mode='json'))
 
     def get_user(self, name: str) -> UserProfile | None:
         doc = self.users.document(name).get()
         return UserProfile(**doc.to_dict()) if doc.exists else None
 
+    def get_users_page(self, limit: int, start_after: str | None = None) -> list[UserProfile]:
+        query = self.users.order_by('__name__').limit(limit)
+        if start_after is not None:
+            # Cursors take a snapshot or field values, not a DocumentReference; the document id is the only field.
+            query = query.start_after({'__name__': start_after})
+        return [UserProfile(**doc.to_dict()) for doc in query.stream()]
+
     def save_events(self, username: str, events: list[Event]) -> None:
-        batch = self.db.batch()
-        for event in events:
-            doc_ref = self.past_events.document()
-            batch.set(
-                doc_ref,
-                {
-                    'user': username,
-                    'content': event.model_dump_json(),
-                    'timestamp': datetime.now(UTC),
-                },
-            )
-        batch.commit()
+        from firebase_admin import firestore
+
+        ref = self.event_history.document(username)
+        now = datetime.now(UTC)
+
+        @firestore.transactional
+        def append(transaction: 'Transaction') -> None:
+            data = ref.get(transaction=transaction).to_dict() or {}
+            history = data.get('events', [])
+            history.extend({**event.model_dump(), 'timestamp': now} for event in events)
+            seen = self.new_event_filter(data.get('seen'))
+            for event in events:
+                seen.add(normalize_name(event.name))
+            transaction.set(ref, {'events': history[-self.history_limit :], 'seen': seen.to_bytes(), 'updated': now})
+
+        append(self.db.transaction())
 
     def get_past_events(self, username: str, limit: int = 60) -> list[Event]:
-        events = (
-            self.past_events.where(filter=FieldFilter('user', '==', username))
-            .order_by('timestamp', direction='DESCENDING')
-            .limit(limit)
-            .stream()
-        )
-        return [Event(**json.loads(doc.to_dict()['content'])) for doc in events] if events else []
+        doc = self.event_history.document(username).get()
+        history = (doc.to_dict() or {}).get('events', []) if doc.exists else []
+        return [Event(name=e['name'], date=e['date'], link=e['link']) for e in reversed(history[-limit:])]
+
+    def get_seen_events(self, username: str) -> BloomFilter:
+        doc = self.event_history.document(username).get(field_paths=['seen'])
+        return self.new_event_filter((doc.to_dict() or {}).get('seen') if doc.exists else None)
+
+    def new_event_filter(self, data: bytes | None = None) -> BloomFilter:
+        return BloomFilter(self.bloom_bits, self.bloom_hashes, data)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        if self.counter_shards > 1:
+            return self._incr_sharded(key, amount)
+
+        from firebase_admin import firestore
 
-    def incr(self, key: str) -> int:
         ref = self.rate_limits.document(key)
-        ref.set({'timestamp': datetime.now(UTC)}, merge=True)
-        ref.update({'count': Increment(1)})
 
-        return ref.get().to_dict().get('count', 0)
+        @firestore.transactional
+        def increment(transaction: 'Transaction') -> int:
+            snapshot = ref.get(transaction=transaction)
+            count = (snapshot.to_dict() or {}).get('count', 0) + amount
+            transaction.set(ref, {'count': count, 'timestamp': datetime.now(UTC)}, merge=True)
+            return count
+
+        return increment(self.db.transaction())
+
+    def get_count(self, key: str) -> int:
+        if self.counter_shards > 1:
+            return self._sharded_count(key)
+
+        doc = self.rate_limits.document(key).get()
+        return (doc.to_dict() or {}).get('count', 0) if doc.exists else 0
+
+    def _incr_sharded(self, key: str, amount: int) -> int:
+        # Spreads writes to a hot key over `counter_shards` documents; the blind Increment never contends.
+        from google.cloud.firestore import Increment
+
+        shards = self.rate_limits.document(key).collection('shards')
+        shards.document(str(random.randrange(self.counter_shards))).set(
+            {'count': Increment(amount), 'timestamp': datetime.now(UTC)}, merge=True
+        )
+        return self._sharded_count(key)
+
+    def _sharded_count(self, key: str) -> int:
+        # Counts from before sharding was enabled stay in the parent document and are added to the shards.
+        ref = self.rate_limits.document(key)
+        doc = ref.get()
+        count = (doc.to_dict() or {}).get('count', 0) if doc.exists else 0
+        return count + sum((shard.to_dict() or {}).get('count', 0) for shard in ref.collection('shards').stream())
 
     def rpush(self, key: str, value: str) -> None:
         self.request_logs.document(key).set(
@@ -79,23 +176,6 @@ class FirebaseRepository:
             merge=True,
         )
 
-    def check_rate_limit(self, username: str, cmd: str) -> bool:
-        now = datetime.now(UTC)
-        one_minute_ago = now - timedelta(seconds=60)
-
-        recent_logs = (
-            self.request_logs.where(filter=FieldFilter('user', '==', username))
-            .where(filter=FieldFilter('timestamp', '>=', one_minute_ago))
-            .order_by('timestamp', direction='DESCENDING')
-            .limit(10)
-            .stream()
-        )
-
-        if sum(1 for _ in recent_logs) >= 30:
-            return False
-
-        return True
-
     def log_request(self, username: str, command: str, success: bool) -> None:
         self.request_logs.add(
             {
@@ -105,3 +185,17 @@ class FirebaseRepository:
                 'success': success,
             }
         )
+
+    def log_requests(self, logs: list[RequestLog]) -> None:
+        for start in range(0, len(logs), self.max_batch_writes):
+            batch = self.db.batch()
+            for log in logs[start : start + self.max_batch_writes]:
+                batch.set(self.request_logs.document(), log.model_dump())
+            batch.commit()
+
+    def get_checkpoint(self, name: str) -> str | None:
+        doc = self.checkpoints.document(name).get()
+        return (doc.to_dict() or {}).get('value') if doc.exists else None
+
+    def save_checkpoint(self, name: str, value: str) -> None:
+        self.checkpoints.document(name).set({'value': value, 'timestamp': datetime.now(UTC)})
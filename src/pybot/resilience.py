@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from typing import Mapping
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random | None = None) -> float:
+    """Full-jitter exponential backoff: uniform in ``[0, min(cap, base * 2**attempt)]``."""
+    return (rng or random).uniform(0, min(cap, base * 2**attempt))
+
+
+def retry_after_delay(headers: Mapping[str, str]) -> float | None:
+    """Reads ``retry-after-ms`` (sent by Azure OpenAI) or ``Retry-After`` in seconds or as an HTTP date."""
+    if (millis := headers.get('retry-after-ms')) is not None:
+        try:
+            return max(float(millis) / 1000, 0.0)
+        except ValueError:
+            pass
+    if (value := headers.get('retry-after')) is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(UTC)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit that adapts by AIMD: +1/limit per healthy call, ``x backoff`` on overload.
+
+    A call counts as overloaded when the upstream throttled it (429/503, timeouts) or its latency exceeded
+    ``latency_target``. Decreases are spaced by ``cooldown`` so one burst of failures that were all in flight
+    together only halves the limit once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        backoff: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = float('-inf')
+        self._condition = asyncio.Condition()
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def __aenter__(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(self.has_capacity)
+            self.in_flight += 1
+
+    async def __aexit__(self, *_: object) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify(max(int(self.limit) - self.in_flight, 1))
+
+    def record(self, latency: float, overloaded: bool = False) -> None:
+        if overloaded or latency > self.latency_target:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def stats(self) -> dict[str, float]:
+        return {'limit': self.limit, 'in_flight': self.in_flight, 'decreases': self.decreases}
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and fails fast for ``reset_timeout`` seconds.
+
+    After that a single probe call is let through (half-open): success closes the breaker, failure re-opens it.
+    A probe that never reports back is replaced once it is ``reset_timeout`` old.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.rejected = 0
+        self.opens = 0
+        self._opened_at: float | None = None
+        self._probe_started: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'open' if time.monotonic() - self._opened_at < self.reset_timeout else 'half_open'
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        probing = self._probe_started is not None and now - self._probe_started < self.reset_timeout
+        if now - self._opened_at < self.reset_timeout or probing:
+            self.rejected += 1
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probe_started is not None or self.failures >= self.failure_threshold:
+            if self._opened_at is None or self._probe_started is not None:
+                self.opens += 1
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'open': self.state != 'closed',
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'opens': self.opens,
+        }
@@ -1,3 +1,4 @@
 from .chatgpt import ChatGPTService
+from .conversation import ConversationMemory
 from .event import EventService
 from .user import UserService
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable
+
+from pydantic import ValidationError
+
+from pybot.model import Event, UserProfile
+from pybot.service.event_parser import EVENT_LIST
+from pybot.setting import BatchingConfig
+
+
+class EventBatcher:
+    """Gathers event recommendation requests for ``window`` seconds and generates them with one completion.
+
+    Up to ``max_batch`` distinct users share a single structured prompt whose JSON answer is keyed by a per-batch
+    user id; each waiting caller then receives its own slice. Users missing from the answer, and batches of one,
+    go through ``generate_one`` instead.
+    """
+
+    def __init__(
+        self,
+        submit: Callable[[str], Awaitable[str]],
+        generate_one: Callable[[UserProfile], Awaitable[list[Event]]],
+        config: BatchingConfig,
+    ):
+        self.submit = submit
+        self.generate_one = generate_one
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.batches = 0
+        self.batched_requests = 0
+        self._pending: dict[str, tuple[UserProfile, list[asyncio.Future[list[Event]]]]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def generate(self, user_profile: UserProfile) -> list[Event]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[list[Event]] = loop.create_future()
+        _, waiters = self._pending.setdefault(user_profile.username, (user_profile, []))
+        waiters.append(future)
+
+        if len(self._pending) >= self.config.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.config.window, self._flush)
+        return await future
+
+    def stats(self) -> dict[str, int]:
+        return {'batches': self.batches, 'batched_requests': self.batched_requests, 'pending': len(self._pending)}
+
+    async def close(self) -> None:
+        self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._run(list(batch.values())), name='event-batch')
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[UserProfile, list[asyncio.Future[list[Event]]]]]) -> None:
+        results: dict[int, list[Event]] = {}
+        if len(batch) > 1:
+            self.batches += 1
+            self.batched_requests += len(batch)
+            try:
+                results = self._parse(await self.submit(self._prompt([profile for profile, _ in batch])), len(batch))
+            except Exception as e:
+                self.logger.error(f'Batched event generation failed: {e}')
+
+        # Users the batch answered are released at once; the fallbacks for the rest run concurrently, and each
+        # caller is released as soon as its own completion is back.
+        for i, (_, waiters) in enumerate(batch, 1):
+            if i in results:
+                self._resolve(waiters, results[i])
+        await asyncio.gather(
+            *(self._generate_one(profile, waiters) for i, (profile, waiters) in enumerate(batch, 1) if i not in results)
+        )
+
+    async def _generate_one(self, profile: UserProfile, waiters: list[asyncio.Future[list[Event]]]) -> None:
+        try:
+            events = await self.generate_one(profile)
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        self._resolve(waiters, events)
+
+    @staticmethod
+    def _resolve(waiters: list[asyncio.Future[list[Event]]], events: list[Event]) -> None:
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(events)
+
+    @staticmethod
+    def _prompt(profiles: list[UserProfile]) -> str:
+        prompt = (
+            f'You are an event planner. For each of the following {len(profiles)} users, generate a list of 3 '
+            'fictional online events tailored to their profile. For each event, include the event name, '
+            "date (in 2025), and a URL. Ensure the events align with each user's specific preferences.\n\n"
+        )
+        for i, profile in enumerate(profiles, 1):
+            prompt += (
+                f'User {i}:\n'
+                f"Interests: {', '.join(sorted(profile.interests))}\n"
+                f"Description: {profile.description or 'No additional context provided.'}\n"
+            )
+        prompt += (
+            '\nRespond with a single JSON object and nothing else, mapping each user number to their events:\n'
+            '{"1": [{"name": "...", "date": "...", "link": "..."}, ...], "2": [...]}'
+        )
+        return prompt
+
+    def _parse(self, response: str, size: int) -> dict[int, list[Event]]:
+        start, end = response.find('{'), response.rfind('}')
+        if response.startswith('Error:') or start < 0 or end < start:
+            self.logger.error(f'Batched event generation failed: {response[:200]}')
+            return {}
+
+        try:
+            data = json.loads(response[start : end + 1])
+        except json.JSONDecodeError as e:
+            self.logger.error(f'Error parsing batched events: {e}')
+            return {}
+
+        results = {}
+        for key, items in data.items() if isinstance(data, dict) else ():
+            try:
+                index = int(str(key).removeprefix('User').strip())
+                events = EVENT_LIST.validate_python(items)
+            except (ValueError, ValidationError):
+                continue
+            if 1 <= index <= size and events:
+                results[index] = events
+        return results
@@ -1,31 +1,299 @@
-import requests
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, AsyncIterator
 
+import httpx
+
+from pybot.metrics import metrics
+from pybot.resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, backoff_delay, retry_after_delay
+from pybot.service.completion_cache import CompletionCache
 from pybot.setting import ChatGPTConfig
+from pybot.singleflight import SingleFlight
 
 
 class ChatGPTService:
-    def __init__(self, config: ChatGPTConfig):
+    def __init__(
+        self,
+        config: ChatGPTConfig,
+        client: httpx.AsyncClient | None = None,
+        cache: CompletionCache | None = None,
+    ):
         self.config = config
+        self.cache = cache
         self.url = f'{config.basicurl}/deployments/{config.modelname}/chat/completions/?api-version={config.apiversion}'
         self.headers = {'Content-Type': 'application/json', 'api-key': config.access_token}
+        self.client = client or httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+        )
+        self.limiter = AdaptiveConcurrencyLimiter(
+            config.initial_concurrency,
+            config.min_concurrency,
+            config.max_concurrency,
+            config.latency_target,
+            config.concurrency_backoff,
+            config.concurrency_cooldown,
+        )
+        self.breaker = CircuitBreaker(config.breaker_failure_threshold, config.breaker_reset_timeout)
+        self.inflight = SingleFlight()
+        self.retries = 0
+        self.hedges = 0
+        self.fallbacks = 0
+
+    async def cached(self, message: str, similar: bool = False) -> str | None:
+        return await self.cache.get(message, similar) if self.cache else None
+
+    async def remember(self, message: str, reply: str) -> None:
+        if self.cache:
+            await self.cache.set(message, reply)
+
+    async def submit(
+        self,
+        message: str,
+        timeout: float | None = None,
+        use_cache: bool = True,
+        json_mode: bool = False,
+        messages: list[dict[str, str]] | None = None,
+        similar: bool = False,
+    ) -> str:
+        # Identical cacheable prompts in flight at the same time share one completion. Callers that opt out of the
+        # cache want a fresh generation, so they are never coalesced. ``messages`` replaces the single user message
+        # with a full conversation; the reply then depends on more than ``message`` and is not cached either.
+        # ``similar`` lets a free-text prompt be answered from a near-identical one; JSON-mode prompts are
+        # per-profile templates and only ever match exactly.
+        if not use_cache or messages:
+            return await self._complete(message, timeout, json_mode, messages)
+        similar = similar and not json_mode
+        return await self.inflight.do(
+            ('submit', message, json_mode, similar), lambda: self._submit_cached(message, timeout, json_mode, similar)
+        )
+
+    async def _submit_cached(self, message: str, timeout: float | None, json_mode: bool, similar: bool) -> str:
+        if self.cache and (cached := await self.cache.get(message, similar)) is not None:
+            return cached
+
+        reply = await self._complete(message, timeout, json_mode)
+        if self.cache and not reply.startswith('Error:'):
+            await self.cache.set(message, reply)
+        return reply
 
-    def submit(self, message: str) -> str:
+    async def _complete(
+        self,
+        message: str,
+        timeout: float | None,
+        json_mode: bool = False,
+        messages: list[dict[str, str]] | None = None,
+    ) -> str:
+        # The deadline covers waiting for a slot, every attempt and the backoff between them; cancellation of the
+        # calling task propagates and releases the pooled connection. The breaker only hears about attempts that
+        # reached the API: a deadline spent queueing behind a shrunken limit is not an API failure.
+        if not self.breaker.allow():
+            return await self._fallback(message, json_mode, messages)
         try:
-            response = requests.post(
-                self.url,
-                json={
-                    'messages': [
-                        {
-                            'role': 'user',
-                            'content': message,
-                        }
-                    ]
-                },
-                headers=self.headers,
-                timeout=120,
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data['choices'][0]['message']['content']
-        except requests.RequestException as e:
+            async with asyncio.timeout(timeout or self.config.timeout):
+                with metrics.span('llm', 'complete'):
+                    data = await self._post_with_retries(self._payload(message, json_mode=json_mode, messages=messages))
+        except TimeoutError:
+            return 'Error: request timed out'
+        except httpx.HTTPError as e:
             return f'Error: {str(e)}'
+        return data['choices'][0]['message']['content']
+
+    async def _post_with_retries(self, payload: dict[str, Any]) -> Any:
+        # One breaker outcome per call, from the attempt that settled it. A call cut short by the caller's deadline
+        # records nothing.
+        for attempt in itertools.count():
+            try:
+                data = await self._hedged_post(payload)
+            except httpx.HTTPError as e:
+                if attempt >= self.config.max_retries or not self._retryable(e):
+                    self._record_outcome(e)
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self._retry_delay(e, attempt))
+            else:
+                self.breaker.record_success()
+                return data
+
+    async def _hedged_post(self, payload: dict[str, Any]) -> Any:
+        # The hedge only goes out while the limiter has spare room, so it never adds load to a throttled API. The
+        # first successful copy wins; if both fail, the original's error is raised.
+        tasks = [asyncio.ensure_future(self._post(payload))]
+        try:
+            if self.config.hedge_after:
+                await asyncio.wait(tasks, timeout=self.config.hedge_after)
+                if not tasks[0].done() and self.limiter.has_capacity() and self.breaker.state == 'closed':
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._post(payload)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _post(self, payload: dict[str, Any]) -> Any:
+        async with self.limiter:
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(self.url, json=payload)
+            except httpx.TimeoutException:
+                self.limiter.record(time.perf_counter() - start, overloaded=True)
+                raise
+            self.limiter.record(time.perf_counter() - start, overloaded=response.status_code in (429, 503))
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _retryable(error: httpx.HTTPError) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    def _retry_delay(self, error: httpx.HTTPError, attempt: int) -> float:
+        delay = backoff_delay(attempt, self.config.retry_base_delay, self.config.retry_max_delay)
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = retry_after_delay(error.response.headers)
+            if retry_after is not None:
+                # Honour the server's wait, with a little jitter so throttled callers do not return in lockstep.
+                base = self.config.retry_base_delay
+                delay = max(delay, retry_after + backoff_delay(0, base, base))
+        return delay
+
+    def _record_outcome(self, error: httpx.HTTPError) -> None:
+        # Client errors (bad request, content filter) say nothing about the health of the API.
+        if self._retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def _fallback(
+        self, message: str, json_mode: bool = False, messages: list[dict[str, str]] | None = None
+    ) -> str:
+        # While the breaker is open, a cached answer to exactly the same plain prompt beats an error. The cache key of
+        # a conversational prompt ignores its history, and JSON-mode callers either checked the cache already or
+        # asked for a fresh generation, so neither is answered from the cache.
+        if self.cache and not json_mode and not messages and (cached := await self.cache.get(message)) is not None:
+            self.fallbacks += 1
+            return cached
+        return 'Error: service temporarily unavailable'
+
+    async def stream(
+        self,
+        message: str,
+        use_cache: bool = True,
+        messages: list[dict[str, str]] | None = None,
+        similar: bool = False,
+    ) -> AsyncIterator[str]:
+        # Server-sent events: one `data: {...}` line per delta, terminated by `data: [DONE]`. The client's read
+        # timeout applies between chunks rather than to the whole generation. Only time spent waiting on the API is
+        # recorded as the llm span, not the time the consumer takes between chunks. Failures are retried only
+        # until the first delta has been yielded.
+        use_cache = use_cache and not messages
+        if use_cache and self.cache and (cached := await self.cache.get(message, similar)) is not None:
+            yield cached
+            return
+        if not self.breaker.allow():
+            yield await self._fallback(message, messages=messages)
+            return
+
+        parts = []
+        waited, mark = 0.0, time.perf_counter()
+        try:
+            for attempt in itertools.count():
+                try:
+                    async with self.limiter:
+                        start = time.perf_counter()
+                        async with self.client.stream(
+                            'POST', self.url, json=self._payload(message, stream=True, messages=messages)
+                        ) as response:
+                            self.limiter.record(
+                                time.perf_counter() - start, overloaded=response.status_code in (429, 503)
+                            )
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                now = time.perf_counter()
+                                waited, mark = waited + now - mark, now
+                                if not line.startswith('data:'):
+                                    continue
+                                data = line[5:].strip()
+                                if data == '[DONE]':
+                                    break
+                                choices = json.loads(data).get('choices') or [{}]
+                                if delta := (choices[0].get('delta') or {}).get('content'):
+                                    parts.append(delta)
+                                    yield delta
+                                    mark = time.perf_counter()
+                    break
+                except httpx.HTTPError as e:
+                    if parts or attempt >= self.config.max_retries or not self._retryable(e):
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(self._retry_delay(e, attempt))
+                    mark = time.perf_counter()
+        except httpx.HTTPError as e:
+            self._record_outcome(e)
+            yield f'Error: {str(e)}'
+            return
+        finally:
+            metrics.record('llm', 'stream', waited)
+
+        self.breaker.record_success()
+        if use_cache and self.cache and parts:
+            await self.cache.set(message, ''.join(parts))
+
+    @staticmethod
+    def _payload(
+        message: str,
+        stream: bool = False,
+        json_mode: bool = False,
+        messages: list[dict[str, str]] | None = None,
+    ) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            'messages': messages
+            or [
+                {
+                    'role': 'user',
+                    'content': message,
+                }
+            ]
+        }
+        if stream:
+            payload['stream'] = True
+        if json_mode:
+            payload['response_format'] = {'type': 'json_object'}
+        return payload
+
+    def stats(self) -> dict[str, float]:
+        return {
+            **self.limiter.stats(),
+            **{f'breaker_{key}': value for key, value in self.breaker.stats().items()},
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'fallbacks': self.fallbacks,
+        }
+
+    async def warm_up(self) -> None:
+        # Any response will do: the point is to have a TLS connection in the pool before the first user prompt.
+        try:
+            await self.client.get(self.config.basicurl, timeout=self.config.connect_timeout)
+        except httpx.HTTPError:
+            pass
+        if self.cache:
+            await self.cache.warm_up()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+        if self.cache:
+            self.cache.close()
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Iterator
+
+from pybot.cache import TTLCache
+from pybot.setting import CompletionCacheConfig
+
+_PRIME = (1 << 31) - 1
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    return ' '.join(prompt.lower().split())
+
+
+def prompt_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, packed as 32-bit values so they are cheap to keep and persist."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 2, seed: int = 7940):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._coefficients = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def shingles(self, normalized: str) -> set[int]:
+        words = _PUNCTUATION.sub(' ', normalized).split()
+        size = min(self.shingle_size, len(words)) or 1
+        return {
+            int.from_bytes(hashlib.blake2b(' '.join(words[i : i + size]).encode(), digest_size=4).digest())
+            for i in range(max(len(words) - size + 1, 1))
+        }
+
+    def signature(self, normalized: str) -> bytes:
+        shingles = self.shingles(normalized)
+        return array('I', (min((a * s + b) % _PRIME for s in shingles) for a, b in self._coefficients)).tobytes()
+
+    @staticmethod
+    def similarity(left: bytes, right: bytes) -> float:
+        a, b = array('I', left), array('I', right)
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class MinHashIndex:
+    """LSH banding over MinHash signatures: only prompts sharing a whole band are compared."""
+
+    def __init__(self, hasher: MinHasher, bands: int = 16):
+        self.hasher = hasher
+        self.bands = bands
+        self._band_width = hasher.num_perm // bands * 4
+        self._buckets: dict[tuple[int, bytes], set[str]] = {}
+        self._signatures: dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._signatures
+
+    def _band_keys(self, signature: bytes) -> Iterator[tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self._band_width : (band + 1) * self._band_width]
+
+    def add(self, key: str, signature: bytes) -> None:
+        self.remove(key)
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, signature: bytes, threshold: float) -> str | None:
+        candidates: set[str] = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        best, best_score = None, threshold
+        for key in candidates:
+            score = self.hasher.similarity(signature, self._signatures[key])
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+
+class CompletionStore:
+    """SQLite table of completions; a file path makes the cache survive restarts, ':memory:' keeps it in-process."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS completions ('
+                'key TEXT PRIMARY KEY, response TEXT NOT NULL, signature BLOB NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at)')
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT response FROM completions WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row:
+                self._conn.execute('UPDATE completions SET accessed_at = ? WHERE key = ?', (now, key))
+        return row[0] if row else None
+
+    def put(self, key: str, response: str, signature: bytes, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)', (key, response, signature, now + ttl, now)
+            )
+
+    def signatures(self) -> list[tuple[str, bytes]]:
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM completions WHERE expires_at <= ?', (time.time(),))
+            return self._conn.execute('SELECT key, signature FROM completions').fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM completions').fetchone()[0]
+
+    def evict(self, keep: int) -> list[str]:
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                'SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?', (keep,)
+            ).fetchall()
+            self._conn.executemany('DELETE FROM completions WHERE key = ?', rows)
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CompletionCache:
+    """Completion cache keyed by a normalized prompt hash.
+
+    Lookups go through an in-memory LRU, then the SQLite store, and finally, when ``similarity_threshold`` is set
+    and the caller asks for it with ``similar``, a MinHash index that returns the response of a near-identical
+    prompt. The index is rebuilt from the store before the first lookup or write, or earlier by ``warm_up``, off
+    the startup path. The store is capped at ``max_entries`` rows, least recently used first out.
+    """
+
+    def __init__(self, config: CompletionCacheConfig):
+        self.config = config
+        self.memory: TTLCache[str, str] = TTLCache(config.maxsize, config.ttl)
+        self.store = CompletionStore(config.path)
+        self.hasher = MinHasher(config.num_perm, config.shingle_size)
+        self.index = MinHashIndex(self.hasher, config.bands)
+        self.similar_hits = 0
+        self._loaded = False
+        self._loading = asyncio.Lock()
+
+    async def warm_up(self) -> None:
+        await self._load_index()
+
+    async def get(self, prompt: str, similar: bool = False) -> str | None:
+        await self._load_index()
+        normalized = normalize_prompt(prompt)
+        key = prompt_key(normalized)
+        if (response := await self._lookup(key)) is not None:
+            return response
+
+        if not similar or not self.config.similarity_threshold:
+            return None
+        match = self.index.query(self.hasher.signature(normalized), self.config.similarity_threshold)
+        if match is None or (response := await self._lookup(match)) is None:
+            return None
+        self.similar_hits += 1
+        return response
+
+    async def set(self, prompt: str, response: str) -> None:
+        await self._load_index()
+        normalized = normalize_prompt(prompt)
+        key = prompt_key(normalized)
+        signature = self.hasher.signature(normalized)
+        self.memory.set(key, response)
+        self.index.add(key, signature)
+        await asyncio.to_thread(self.store.put, key, response, signature, self.config.ttl)
+
+        if await asyncio.to_thread(self.store.count) > self.config.max_entries:
+            evicted = await asyncio.to_thread(self.store.evict, int(self.config.max_entries * 0.9))
+            for evicted_key in evicted:
+                self.index.remove(evicted_key)
+                self.memory.pop(evicted_key)
+
+    async def _load_index(self) -> None:
+        if self._loaded:
+            return
+        async with self._loading:
+            if self._loaded:
+                return
+            for key, signature in await asyncio.to_thread(self.store.signatures):
+                if key not in self.index:
+                    self.index.add(key, signature)
+            self._loaded = True
+
+    async def _lookup(self, key: str) -> str | None:
+        if (response := self.memory.get(key)) is not None:
+            return response
+        response = await asyncio.to_thread(self.store.get, key)
+        if response is not None:
+            self.memory.set(key, response)
+        return response
+
+    def stats(self) -> dict[str, float]:
+        return {**self.memory.stats(), 'similar_hits': self.similar_hits, 'entries': len(self.index)}
+
+    def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import math
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from pybot.cache import TTLCache
+from pybot.service.chatgpt import ChatGPTService
+from pybot.setting import ConversationConfig
+
+Message = dict[str, str]
+
+# Chat format overhead per message (role and separators) and for priming the reply, as in OpenAI's token guide.
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+_PIECES = re.compile(r'\w+|[^\w\s]+')
+
+
+class Tokenizer:
+    """Counts prompt tokens locally.
+
+    Uses ``tiktoken`` when it is installed; otherwise estimates BPE tokens as one per punctuation run and one per
+    four characters of a word, which overestimates English slightly and so errs on the side of a smaller prompt.
+    """
+
+    def __init__(self, encoding: str = 'cl100k_base'):
+        try:
+            import tiktoken  # optional, for exact counts
+        except ImportError:
+            self._encoding: Any = None
+        else:
+            self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return sum(math.ceil(len(piece) / 4) for piece in _PIECES.findall(text))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """Keeps the first ``tokens`` tokens of ``text``."""
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[:tokens])
+        used = 0
+        for match in _PIECES.finditer(text):
+            used += math.ceil(len(match.group()) / 4)
+            if used > tokens:
+                return text[: match.start()].rstrip()
+        return text
+
+    def count_messages(self, messages: list[Message]) -> int:
+        return sum(self.count(message['content']) + MESSAGE_OVERHEAD for message in messages) + REPLY_OVERHEAD
+
+
+def trim_to_budget(tokenizer: Tokenizer, context: list[Message], message: str, budget: int) -> list[Message]:
+    """Returns the newest suffix of ``context`` that fits in ``budget`` tokens together with ``message``.
+
+    A leading system message (the conversation summary) is kept ahead of older turns. The user message itself is
+    never dropped; if it alone exceeds the budget it is truncated.
+    """
+    available = budget - REPLY_OVERHEAD - MESSAGE_OVERHEAD - tokenizer.count(message)
+    if available <= 0:
+        return [{'role': 'user', 'content': tokenizer.truncate(message, budget - REPLY_OVERHEAD - MESSAGE_OVERHEAD)}]
+
+    system, turns = (context[:1], context[1:]) if context and context[0]['role'] == 'system' else ([], context)
+    if system and (cost := tokenizer.count(system[0]['content']) + MESSAGE_OVERHEAD) <= available:
+        available -= cost
+    else:
+        system = []
+    kept: list[Message] = []
+    for turn in reversed(turns):
+        cost = tokenizer.count(turn['content']) + MESSAGE_OVERHEAD
+        if cost > available:
+            # Stop at the first turn that does not fit, so the kept history stays contiguous.
+            break
+        available -= cost
+        kept.append(turn)
+    if kept and kept[-1]['role'] == 'assistant':
+        # A reply is meaningless without the message it answers.
+        kept.pop()
+    return [*system, *reversed(kept), {'role': 'user', 'content': message}]
+
+
+@dataclass
+class _Conversation:
+    turns: deque[tuple[str, str]]
+    summary: str = ''
+    evicted: list[tuple[str, str]] = field(default_factory=list)
+
+
+class ConversationMemory:
+    """Per-chat history for free-text messages, kept at a flat size as conversations grow.
+
+    The last ``max_turns`` exchanges are kept verbatim in a ring buffer. Exchanges pushed out of it are folded into a
+    rolling summary by a background completion once ``summarize_after`` of them have accumulated; until then they
+    still count as history. Every prompt is trimmed to ``max_prompt_tokens`` by :func:`trim_to_budget` before it
+    is sent. Chats idle for ``ttl`` seconds, or beyond the ``max_chats`` most recent, are forgotten.
+    """
+
+    def __init__(self, chatgpt: ChatGPTService, config: ConversationConfig):
+        self.chatgpt = chatgpt
+        self.config = config
+        self.tokenizer = Tokenizer(config.tokenizer)
+        self.logger = logging.getLogger(__name__)
+        self.summaries = 0
+        self.trimmed = 0
+        self._chats: TTLCache[int, _Conversation] = TTLCache(config.max_chats, config.ttl)
+        self._summarizing: dict[int, asyncio.Task[None]] = {}
+
+    def prompt(self, chat_id: int, message: str) -> list[Message] | None:
+        """Builds the message list for ``message``: summary, recent turns, then the message, within budget.
+
+        Returns ``None`` when there is no history to send, so the message goes out as a plain, cacheable prompt.
+        """
+        conversation = self._chats.get(chat_id)
+        context: list[Message] = []
+        if conversation is not None:
+            if conversation.summary:
+                summary = f'Summary of the conversation so far: {conversation.summary}'
+                context.append({'role': 'system', 'content': summary})
+            for user, assistant in (*conversation.evicted, *conversation.turns):
+                context += [{'role': 'user', 'content': user}, {'role': 'assistant', 'content': assistant}]
+        messages = trim_to_budget(self.tokenizer, context, message, self.config.max_prompt_tokens)
+        if len(messages) < len(context) + 1:
+            self.trimmed += 1
+        if messages == [{'role': 'user', 'content': message}]:
+            return None
+        return messages
+
+    def record(self, chat_id: int, message: str, reply: str) -> None:
+        conversation = self._chats.get(chat_id)
+        if conversation is None:
+            conversation = _Conversation(deque(maxlen=self.config.max_turns))
+        if len(conversation.turns) == conversation.turns.maxlen:
+            conversation.evicted.append(conversation.turns[0])
+        conversation.turns.append((message, reply))
+        self._chats.set(chat_id, conversation)
+        if len(conversation.evicted) >= self.config.summarize_after and chat_id not in self._summarizing:
+            task = asyncio.create_task(self._summarize(chat_id, conversation), name=f'summarize-{chat_id}')
+            self._summarizing[chat_id] = task
+            task.add_done_callback(lambda done: self._forget(chat_id, done))
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'chats': len(self._chats),
+            'summaries': self.summaries,
+            'trimmed': self.trimmed,
+            'summarizing': len(self._summarizing),
+        }
+
+    async def close(self) -> None:
+        tasks = list(self._summarizing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _forget(self, chat_id: int, task: asyncio.Task[None]) -> None:
+        if self._summarizing.get(chat_id) is task:
+            del self._summarizing[chat_id]
+
+    async def _summarize(self, chat_id: int, conversation: _Conversation) -> None:
+        header = (
+            f'Update the summary of a conversation between a user and an assistant with the new exchanges below. '
+            f'Keep names, preferences and open questions; reply with the summary only, in at most '
+            f'{self.config.summary_tokens} tokens.\n\n'
+            f'Current summary: {conversation.summary or "(none)"}\n\nNew exchanges:\n'
+        )
+        # Exchanges are taken oldest first while they fit; the rest stay pending for the next round. Only one that
+        # is too long on its own is cut, so every round makes progress.
+        available = self.config.max_prompt_tokens - self.tokenizer.count(header) - MESSAGE_OVERHEAD - REPLY_OVERHEAD
+        exchanges: list[str] = []
+        for user, assistant in conversation.evicted:
+            exchange = f'User: {user}\nAssistant: {assistant}'
+            cost = self.tokenizer.count(exchange) + 1
+            if cost > available:
+                if not exchanges:
+                    exchanges.append(self.tokenizer.truncate(exchange, max(available, 0)))
+                break
+            available -= cost
+            exchanges.append(exchange)
+
+        summary = await self.chatgpt.submit(header + '\n'.join(exchanges), use_cache=False)
+        if summary.startswith('Error:'):
+            # Keep the turns as history; bound them so a failing API cannot grow the chat without limit.
+            self.logger.warning(f'Summarizing chat {chat_id} failed: {summary}')
+            del conversation.evicted[: -self.config.max_turns]
+            return
+        conversation.summary = self.tokenizer.truncate(summary.strip(), self.config.summary_tokens)
+        # Exchanges left out of this round, or evicted while the summary was being written, stay pending.
+        del conversation.evicted[: len(exchanges)]
+        self.summaries += 1
@@ -1,87 +1,141 @@
-import logging
-
+from pybot.async_repository import AsyncRepository
+from pybot.bloom import normalize_name
 from pybot.model import Event, UserProfile
-from pybot.repository import FirebaseRepository
+from pybot.service.batching import EventBatcher
 from pybot.service.chatgpt import ChatGPTService
+from pybot.service.event_parser import EVENTS_JSON_INSTRUCTIONS, format_events, parse_events
+from pybot.service.prefetch import RecommendationPrefetcher, profile_fingerprint
+from pybot.setting import BatchingConfig, DedupConfig, PrefetchConfig
+from pybot.singleflight import SingleFlight
 
 
 class EventService:
-    def __init__(self, chatgpt_service: ChatGPTService, repo: FirebaseRepository):
+    def __init__(
+        self,
+        chatgpt_service: ChatGPTService,
+        repo: AsyncRepository,
+        prefetch_config: PrefetchConfig,
+        batching_config: BatchingConfig,
+        dedup_config: DedupConfig,
+    ):
         self.chatgpt_service = chatgpt_service
         self.repo = repo
-
-    def recommend_events(self, user_profile: UserProfile) -> list[Event]:
-        if not user_profile.interests:
-            return []
-
-        interests_str = ', '.join(user_profile.interests)
-        prompt = (
-            'You are an event planner. Generate a list of 3 fictional online events tailored to a user with the following profile:\n'
-            f'Interests: {interests_str}\n'
-            f"Description: {user_profile.description or 'No additional context provided.'}\n\n"
-            'For each event, include the event name, date (in 2025), and a URL. '
-            "Ensure the events align with the user's specific preferences. "
-            'Format your response as a numbered list like this:\n'
-            '1. Event Name - Date - URL\n'
-            '2. Event Name - Date - URL\n'
-            '3. Event Name - Date - URL'
+        self.dedup_config = dedup_config
+        self.inflight = SingleFlight()
+        self.prefetcher = (
+            RecommendationPrefetcher(self.generate_fresh_events, prefetch_config) if prefetch_config.enabled else None
+        )
+        self.batcher = (
+            EventBatcher(self._submit_uncached, self.generate_fresh_events_unbatched, batching_config)
+            if batching_config.enabled
+            else None
         )
 
-        events = self._parse_events(self.chatgpt_service.submit(prompt))
+    async def recommend_events(self, user_profile: UserProfile) -> list[Event]:
+        # Repeated taps on "Events" while a recommendation is being generated share it instead of each running an
+        # LLM call and a save_events write.
+        key = ('recommend_events', user_profile.username, profile_fingerprint(user_profile))
+        return await self.inflight.do(key, lambda: self._recommend_events(user_profile))
+
+    async def _recommend_events(self, user_profile: UserProfile) -> list[Event]:
+        events = await self.generate_events(user_profile)
         if events:
-            self.repo.save_events(user_profile.username, events)
+            await self.repo.save_events(user_profile.username, events)
+        if self.prefetcher:
+            self.prefetcher.schedule_refill(user_profile)
         return events
 
-    def recommend_more_events(self, user_profile: UserProfile) -> list[Event]:
+    async def take_prefetched_events(self, user_profile: UserProfile) -> list[Event]:
+        if not self.prefetcher or not (events := self.prefetcher.take(user_profile)):
+            return []
+        await self.repo.save_events(user_profile.username, events)
+        return events
+
+    async def digest_events(self, user_profile: UserProfile) -> list[Event]:
+        # The digest must not repeat what the user already has: the completion cache would hand back yesterday's
+        # digest or today's /events reply, so events come from the prefetch buffer (generated uncached) or a fresh
+        # generation, and anything in the seen-events filter is dropped.
+        if self.prefetcher and (events := self.prefetcher.take(user_profile)):
+            seen = await self.repo.get_seen_events(user_profile.username)
+            if events := [event for event in events if normalize_name(event.name) not in seen]:
+                await self.repo.save_events(user_profile.username, events)
+                return events
+        return await self.recommend_more_events(user_profile)
+
+    def on_profile_change(self, user_profile: UserProfile) -> None:
+        if self.prefetcher:
+            self.prefetcher.invalidate(user_profile)
+
+    async def generate_fresh_events(self, user_profile: UserProfile) -> list[Event]:
+        return await self.generate_events(user_profile, use_cache=False)
+
+    async def generate_events(self, user_profile: UserProfile, use_cache: bool = True) -> list[Event]:
         if not user_profile.interests:
             return []
 
-        past_events = self.repo.get_past_events(user_profile.username, 10)
-        past_events_str = ', '.join([event.name for event in past_events]) if past_events else 'none'
+        prompt = self._events_prompt(user_profile)
+        if not self.batcher:
+            return parse_events(await self.chatgpt_service.submit(prompt, use_cache=use_cache, json_mode=True))
+
+        if use_cache and (cached := await self.chatgpt_service.cached(prompt)) is not None:
+            return parse_events(cached)
+        events = await self.batcher.generate(user_profile)
+        if use_cache and events:
+            await self.chatgpt_service.remember(prompt, format_events(events))
+        return events
 
-        logging.error(f'Past events: {past_events_str}')
-        interests_str = ', '.join(user_profile.interests)
-        prompt = (
-            'You are an event planner. Generate a list of 3 new fictional online events tailored to a user with the following profile:\n'
+    async def generate_fresh_events_unbatched(self, user_profile: UserProfile) -> list[Event]:
+        return parse_events(await self._submit_uncached(self._events_prompt(user_profile)))
+
+    async def _submit_uncached(self, prompt: str) -> str:
+        return await self.chatgpt_service.submit(prompt, use_cache=False, json_mode=True)
+
+    @staticmethod
+    def _events_prompt(user_profile: UserProfile, count: int = 3, new: bool = False) -> str:
+        interests_str = ', '.join(sorted(user_profile.interests))
+        return (
+            f"You are an event planner. Generate a list of {count} {'new ' if new else ''}fictional online events "
+            'tailored to a user with the following profile:\n'
             f'Interests: {interests_str}\n'
             f"Description: {user_profile.description or 'No additional context provided.'}\n\n"
-            'For each event, include the event name, date (in 2025), and a URL.'
-            "Ensure the events align with the user's specific preferences "
-            f'and are different from these previously suggested events: {past_events_str}. '
-            'Format your response as a numbered list like this:\n'
-            '1. Event Name - Date - URL\n'
-            '2. Event Name - Date - URL\n'
-            '3. Event Name - Date - URL'
+            'For each event, include the event name, date (in 2025), and a URL. '
+            "Ensure the events align with the user's specific preferences.\n"
+            f'{EVENTS_JSON_INSTRUCTIONS}'
         )
 
-        events = self._parse_events(self.chatgpt_service.submit(prompt))
-        if events:
-            self.repo.save_events(user_profile.username, events)
-        return events
+    async def recommend_more_events(self, user_profile: UserProfile) -> list[Event]:
+        key = ('recommend_more_events', user_profile.username, profile_fingerprint(user_profile))
+        return await self.inflight.do(key, lambda: self._recommend_more_events(user_profile))
 
-    def _parse_events(self, response: str) -> list[Event]:
-        if 'Error' in response:
+    async def _recommend_more_events(self, user_profile: UserProfile) -> list[Event]:
+        # Novelty is enforced locally against the user's seen-events Bloom filter instead of listing past events in
+        # the prompt, so the prompt stays the same size however long the history grows. A few extra events are
+        # requested to absorb duplicates, and only the still-missing slots are re-requested.
+        if not user_profile.interests:
             return []
 
-        events = []
-        try:
-            for line in response.strip().split('\n'):
-                if line.strip() and line[0].isdigit():
-                    parts = line.split(' - ')
-                    if not len(parts) == 3:
-                        continue
-                    name, date, url = parts
-                    events.append(
-                        Event(
-                            **{
-                                'name': name[3:].strip(),
-                                'date': date.strip(),
-                                'link': url.strip(),
-                            }
-                        )
-                    )
-        except Exception as e:
-            logging.error(f'Error parsing events: {e}')
-            return []
+        seen = await self.repo.get_seen_events(user_profile.username)
+        events: list[Event] = []
+        for _ in range(self.dedup_config.max_attempts):
+            missing = self.dedup_config.events - len(events)
+            prompt = self._events_prompt(user_profile, missing + self.dedup_config.overgenerate, new=True)
+            for event in parse_events(await self.chatgpt_service.submit(prompt, use_cache=False, json_mode=True)):
+                key = normalize_name(event.name)
+                if key in seen:
+                    continue
+                seen.add(key)
+                events.append(event)
+                if len(events) == self.dedup_config.events:
+                    break
+            if len(events) == self.dedup_config.events:
+                break
 
+        if events:
+            await self.repo.save_events(user_profile.username, events)
         return events
+
+    async def close(self) -> None:
+        if self.prefetcher:
+            await self.prefetcher.close()
+        if self.batcher:
+            await self.batcher.close()
@@ -0,0 +1,50 @@
+import logging
+import re
+
+from pydantic import TypeAdapter, ValidationError
+
+from pybot.model import Event
+
+EVENT_LIST = TypeAdapter(list[Event])
+EVENTS_JSON_INSTRUCTIONS = (
+    'Respond with a single JSON object and nothing else, in this format:\n'
+    '{"events": [{"name": "Event Name", "date": "Date", "link": "URL"}, ...]}'
+)
+
+_NUMBERED_LINE = re.compile(r'^\s*\d+\s*[.)]\s*(?P<body>.+?)\s*$', re.MULTILINE)
+_FIELD_LABEL = re.compile(r'^\W*(name|date|url|link)\W*:\s*', re.IGNORECASE)
+
+
+def format_events(events: list[Event]) -> str:
+    return f'{{"events": {EVENT_LIST.dump_json(events).decode()}}}'
+
+
+def parse_events(response: str) -> list[Event]:
+    """Parses a completion into events, preferring the JSON contract and falling back to a numbered list.
+
+    The JSON path slices out the ``events`` array and validates it with one ``TypeAdapter`` call, so well-formed
+    responses are handled in a single pass without building intermediate dicts.
+    """
+    if response.startswith('Error:'):
+        return []
+
+    start, end = response.find('['), response.rfind(']')
+    if start >= 0 and end > start:
+        try:
+            return EVENT_LIST.validate_json(response[start : end + 1])
+        except ValidationError as e:
+            logging.debug(f'Falling back to free-text event parsing: {e}')
+    return parse_free_text_events(response)
+
+
+def parse_free_text_events(response: str) -> list[Event]:
+    # Splitting from the right keeps event names that contain ' - ' intact.
+    events = []
+    for match in _NUMBERED_LINE.finditer(response):
+        parts = match.group('body').rsplit(' - ', 2)
+        if len(parts) != 3:
+            continue
+        name, date, link = (_FIELD_LABEL.sub('', part).strip(' *') for part in parts)
+        if name and date and link:
+            events.append(Event(name=name, date=date, link=link))
+    return events
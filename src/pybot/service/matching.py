@@ -0,0 +1,81 @@
+import heapq
+import math
+import re
+
+from pybot.model import UserProfile
+
+_SEPARATORS = re.compile(r'[\s,#]+')
+
+
+def normalize_interests(interests: set[str]) -> frozenset[str]:
+    return frozenset(term for interest in interests for term in _SEPARATORS.split(interest.lower()) if term)
+
+
+class MatchingEngine:
+    """In-memory user matcher over an inverted index of interest terms.
+
+    Users are scored only against candidates that share at least one term, using either cosine similarity of sparse
+    TF-IDF vectors (rare shared interests count for more) or plain Jaccard overlap. IDF weights are computed at query
+    time from the live document frequencies, so ``upsert`` and ``remove`` stay O(terms).
+    """
+
+    def __init__(self, metric: str = 'cosine'):
+        if metric not in ('cosine', 'jaccard'):
+            raise ValueError(f'Unknown matching metric: {metric}')
+        self.metric = metric
+        self._terms: dict[str, frozenset[str]] = {}
+        self._index: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def upsert(self, user: UserProfile) -> None:
+        self.remove(user.username)
+        terms = normalize_interests(user.interests)
+        if not terms:
+            return
+        self._terms[user.username] = terms
+        for term in terms:
+            self._index.setdefault(term, set()).add(user.username)
+
+    def remove(self, username: str) -> None:
+        for term in self._terms.pop(username, ()):
+            users = self._index[term]
+            users.discard(username)
+            if not users:
+                del self._index[term]
+
+    def top_k(self, username: str, k: int = 3) -> list[tuple[str, float]]:
+        terms = self._terms.get(username)
+        if not terms:
+            return []
+
+        candidates = set().union(*(self._index[term] for term in terms))
+        candidates.discard(username)
+        if self.metric == 'jaccard':
+            scores = {other: self._jaccard(terms, self._terms[other]) for other in candidates}
+        else:
+            idf: dict[str, float] = {}
+            vector = {term: self._idf(term, idf) for term in terms}
+            norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+            scores = {other: self._cosine(vector, norm, self._terms[other], idf) for other in candidates}
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _idf(self, term: str, memo: dict[str, float]) -> float:
+        if term not in memo:
+            memo[term] = math.log((1 + len(self._terms)) / (1 + len(self._index.get(term, ())))) + 1
+        return memo[term]
+
+    def _cosine(self, vector: dict[str, float], norm: float, other: frozenset[str], memo: dict[str, float]) -> float:
+        dot = 0.0
+        other_norm = 0.0
+        for term in other:
+            weight = self._idf(term, memo)
+            other_norm += weight * weight
+            dot += vector.get(term, 0.0) * weight
+        return dot / (norm * math.sqrt(other_norm))
+
+    @staticmethod
+    def _jaccard(terms: frozenset[str], other: frozenset[str]) -> float:
+        return len(terms & other) / len(terms | other)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
+
+from pybot.model import Event, UserProfile
+from pybot.ratelimit import TokenBucket
+from pybot.setting import PrefetchConfig
+
+
+def profile_fingerprint(user_profile: UserProfile) -> tuple[tuple[str, ...], str]:
+    return tuple(sorted(user_profile.interests)), user_profile.description
+
+
+class RecommendationPrefetcher:
+    """Keeps a few ready-made event recommendations per user so /events can be answered from memory.
+
+    Buffers are refilled in the background when they run low or the user's profile changes, and every generation
+    spends a token from a global budget shared by all users, so prefetching never exceeds the configured API rate.
+    Only the ``max_users`` most recently active users keep a buffer.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[UserProfile], Awaitable[list[Event]]],
+        config: PrefetchConfig,
+    ):
+        self.generate = generate
+        self.config = config
+        self.budget = TokenBucket(config.budget_per_minute / 60, config.burst)
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._buffers: OrderedDict[str, tuple[tuple[tuple[str, ...], str], deque[list[Event]]]] = OrderedDict()
+        self._refilling: dict[str, asyncio.Task[None]] = {}
+
+    def take(self, user_profile: UserProfile) -> list[Event] | None:
+        buffer = self._buffer(user_profile)
+        events = buffer.popleft() if buffer else None
+        if events:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if len(buffer) <= self.config.low_watermark:
+            self.schedule_refill(user_profile)
+        return events
+
+    def invalidate(self, user_profile: UserProfile) -> None:
+        # Saves that leave interests and description alone, such as recording the chat id, keep the buffer.
+        entry = self._buffers.get(user_profile.username)
+        if entry is not None and entry[0] == profile_fingerprint(user_profile):
+            return
+        self._buffers.pop(user_profile.username, None)
+        task = self._refilling.pop(user_profile.username, None)
+        if task is not None:
+            task.cancel()
+        if user_profile.interests:
+            self.schedule_refill(user_profile)
+
+    def schedule_refill(self, user_profile: UserProfile) -> None:
+        if user_profile.username in self._refilling:
+            return
+        task = asyncio.create_task(self._refill(user_profile), name=f'prefetch-{user_profile.username}')
+        self._refilling[user_profile.username] = task
+        task.add_done_callback(lambda done: self._forget(user_profile.username, done))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'users': len(self._buffers),
+            'hits': self.hits,
+            'misses': self.misses,
+            'skipped': self.skipped,
+            'refilling': len(self._refilling),
+        }
+
+    async def close(self) -> None:
+        tasks = list(self._refilling.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _forget(self, username: str, task: asyncio.Task[None]) -> None:
+        if self._refilling.get(username) is task:
+            del self._refilling[username]
+
+    def _buffer(self, user_profile: UserProfile) -> deque[list[Event]]:
+        fingerprint = profile_fingerprint(user_profile)
+        entry = self._buffers.get(user_profile.username)
+        if entry is None or entry[0] != fingerprint:
+            entry = self._buffers[user_profile.username] = (fingerprint, deque(maxlen=self.config.buffer_size))
+        self._buffers.move_to_end(user_profile.username)
+        while len(self._buffers) > self.config.max_users:
+            self._buffers.popitem(last=False)
+        return entry[1]
+
+    async def _refill(self, user_profile: UserProfile) -> None:
+        buffer = self._buffer(user_profile)
+        while len(buffer) < self.config.buffer_size:
+            if not self.budget.try_acquire():
+                self.skipped += 1
+                return
+            try:
+                events = await self.generate(user_profile)
+            except Exception as e:
+                self.logger.error(f'Prefetching events for {user_profile.username} failed: {e}')
+                return
+            if not events:
+                return
+            buffer.append(events)
@@ -1,78 +1,113 @@
 import logging
+from typing import TYPE_CHECKING, Callable
 
+from pybot.async_repository import AsyncRepository
+from pybot.cache import TTLCache
 from pybot.model import UserProfile
-from pybot.repository import FirebaseRepository
 from pybot.service.chatgpt import ChatGPTService
+from pybot.service.matching import MatchingEngine
+from pybot.setting import CacheConfig, MatchingConfig
+
+if TYPE_CHECKING:
+    from pybot.redis_state import RedisCache
 
 
 class UserService:
-    def __init__(self, chatgpt_service: ChatGPTService, repo: FirebaseRepository):
+    def __init__(
+        self,
+        chatgpt_service: ChatGPTService,
+        repo: AsyncRepository,
+        cache_config: CacheConfig,
+        matching_config: MatchingConfig,
+        shared_cache: 'RedisCache[UserProfile] | None' = None,
+    ):
         self.chatgpt_service = chatgpt_service
         self.repo = repo
+        self.cache: TTLCache[str, UserProfile] = TTLCache(cache_config.maxsize, cache_config.ttl)
+        self.shared_cache = shared_cache
+        self.matching_config = matching_config
+        self.matching = MatchingEngine(matching_config.metric)
+        self.profile_listeners: list[Callable[[UserProfile], None]] = []
 
-    def register_user(self, username: str, interests: list[str], description: str = '') -> None:
-        self.repo.save_user(
+    async def register_user(
+        self, username: str, interests: list[str], description: str = '', chat_id: int | None = None
+    ) -> None:
+        await self.save_user(
             UserProfile(
                 username=username,
                 interests=set(interests),
                 description=description.strip(),
+                chat_id=chat_id,
             )
         )
 
-    def get_user(self, username: str) -> UserProfile:
+    async def remember_chat(self, username: str, chat_id: int) -> None:
+        """Stores the private chat of a registered user, for messages the bot sends on its own."""
+        user = await self.get_user(username)
+        # A profile without interests is either unregistered (and not stored) or would get no digest anyway.
+        if user.chat_id != chat_id and user.interests:
+            await self.save_user(user.model_copy(update={'chat_id': chat_id}))
+
+    async def save_user(self, user: UserProfile) -> None:
+        try:
+            await self.repo.save_user(user)
+        except Exception:
+            self.cache.pop(user.username)
+            if self.shared_cache is not None:
+                await self.shared_cache.pop(user.username)
+            raise
+        self.cache.set(user.username, user)
+        if self.shared_cache is not None:
+            await self.shared_cache.set(user.username, user)
+        self.matching.upsert(user)
+        for listener in self.profile_listeners:
+            listener(user)
+
+    async def get_user(self, username: str) -> UserProfile:
+        # Cached profiles are shared between callers, so they must be treated as immutable; use model_copy to modify.
+        if (cached := self.cache.get(username)) is not None:
+            return cached
 
-        user_data = self.repo.get_user(username)
-        return user_data if user_data else UserProfile(username=username, interests=set())
+        user = await self.shared_cache.get(username) if self.shared_cache is not None else None
+        if user is None:
+            user_data = await self.repo.get_user(username)
+            user = user_data if user_data else UserProfile(username=username, interests=set())
+            if self.shared_cache is not None:
+                await self.shared_cache.set(username, user)
+        self.cache.set(username, user)
+        return user
 
-    def find_matches(self, username: str) -> list[str]:
-        users_data = self.repo.get_user(username)
-        if username not in users_data:
-            return []
+    async def load_matching_index(self) -> None:
+        async for page in self.repo.iter_users(self.matching_config.page_size):
+            for user in page:
+                self.matching.upsert(user)
+        logging.info(f'Matching index loaded with {len(self.matching)} users')
 
-        current_user = UserProfile(**users_data[username])
-        other_users = [UserProfile(**data) for u, data in users_data.items() if u != username]
-        if not other_users:
-            return []
+    async def find_matches(self, username: str) -> list[str]:
+        self.matching.upsert(await self.get_user(username))
+        return [name for name, _ in self.matching.top_k(username, self.matching_config.top_k)]
+
+    async def explain_matches(self, username: str, matches: list[str]) -> str:
+        current_user = await self.get_user(username)
+        other_users = [await self.get_user(match) for match in matches]
 
         prompt = (
             'You are a matchmaking assistant. I have a user with the following profile:\n'
-            f"Interests: {', '.join(current_user.interests)}\n"
+            f"Interests: {', '.join(sorted(current_user.interests))}\n"
             f"Description: {current_user.description or 'No additional context provided.'}\n\n"
-            'Here are other user profiles:\n'
+            'These users were matched with them:\n'
         )
-        for i, user in enumerate(other_users, 1):
+        for user in other_users:
             prompt += (
-                f'User {i}:\n'
-                f"Interests: {', '.join(user.interests)}\n"
+                f'{user.username}:\n'
+                f"Interests: {', '.join(sorted(user.interests))}\n"
                 f"Description: {user.description or 'No additional context provided.'}\n"
             )
-        prompt += (
-            '\nBased on the interests and descriptions, suggest up to 3 users who are the best matches '
-            'for the first user. Provide their user numbers (e.g., User 1, User 2) and a brief reason '
-            'for each match. Format your response as:\n'
-            '- User X: [reason]\n'
-            '- User Y: [reason]\n'
-            '- User Z: [reason]'
-        )
+        prompt += '\nIn one short sentence per user, explain why each is a good match. Format: - username: reason'
 
-        response = self.chatgpt_service.submit(prompt)
-        if 'Error' in response:
-            return []
-
-        matches = []
-        try:
-            for line in response.strip().split('\n'):
-                if line.startswith('- User'):
-                    user_num = int(line.split(':')[0].split('User')[1].strip()) - 1
-                    if 0 <= user_num < len(other_users):
-                        matches.append(other_users[user_num].username)
-        except Exception as e:
-            logging.error(f'Error parsing matches: {e}')
-            return []
+        response = await self.chatgpt_service.submit(prompt)
+        return '' if response.startswith('Error:') else response.strip()
 
-        return matches
-    
-    def add_interest(self, username: str, interest: list[str])-> None:
-        user = self.get_user(username)
-        user.interests = user.interests.union(set(interest))
-        self.repo.save_user(user)
\ No newline at end of file
+    async def add_interest(self, username: str, interest: list[str])-> None:
+        user = await self.get_user(username)
+        await self.save_user(user.model_copy(update={'interests': user.interests.union(set(interest))}))
\ No newline at end of file
@@ -1,13 +1,18 @@
 import configparser
+import functools
+import json
 import os
 from enum import StrEnum
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings
 
 
 class TelegramConfig(BaseModel):
     access_token: str
+    # Updates handled at once. Handlers wait for their replies to be delivered, so processing updates one at a time
+    # would let a chat held back by its flood limit stall every other chat.
+    concurrent_updates: int = 64
 
 
 class ChatGPTConfig(BaseModel):
@@ -15,6 +20,28 @@ class ChatGPTConfig(BaseModel):
     modelname: str
     apiversion: str
     access_token: str
+    timeout: float = 120
+    connect_timeout: float = 10
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30
+    # Calls to the API are capped by an AIMD limit between min_concurrency and max_concurrency: it grows while
+    # calls finish under latency_target and is multiplied by concurrency_backoff on 429/503, timeouts or slow calls.
+    max_concurrency: int = 10
+    min_concurrency: int = 1
+    initial_concurrency: int = 4
+    latency_target: float = 20
+    concurrency_backoff: float = 0.5
+    concurrency_cooldown: float = 1.0
+    # Retries use full-jitter exponential backoff, or the server's Retry-After when it is longer.
+    max_retries: int = 2
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 8
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30
+    # Send a second copy of a completion that has not answered after hedge_after seconds (0 disables), if the
+    # limiter has room for it.
+    hedge_after: float = 0
 
 
 class RedisConfig(BaseModel):
@@ -24,12 +51,180 @@ class RedisConfig(BaseModel):
     ssl: bool = False
     username: str | None = None
     decode_responses: bool = True
+    enabled: bool = False
+    prefix: str = 'pybot'
+    sync_interval: float = 1.0
+    local_ttl: float = 5
+
+
+class StorageBackend(StrEnum):
+    FIRESTORE = 'firestore'
+    SQLITE = 'sqlite'
+
+
+class StorageConfig(BaseModel):
+    backend: StorageBackend = StorageBackend.FIRESTORE
+    path: str = 'pybot.sqlite3'
+    max_workers: int = 16
+    history_limit: int = 60
+    # Per generation of the seen-events filter: 8192 bits and 6 hashes hold about 950 events at a 1.6% false-positive
+    # rate before the oldest generation is aged out.
+    bloom_bits: int = 8192
+    bloom_hashes: int = 6
+
+
+class SenderConfig(BaseModel):
+    # Telegram allows about 30 messages per second overall, one per second in a chat and 20 per minute in a group.
+    global_rate: float = 30
+    global_burst: int = 30
+    chat_rate: float = 1.0
+    chat_burst: int = 3
+    group_rate: float = 20 / 60
+    group_burst: int = 3
+    max_retries: int = 3
+    max_chats: int = 10000
+    bucket_ttl: float = 60
+
+
+class RateLimitConfig(BaseModel):
+    window: int = 60
+    default_quota: int = 30
+    quotas: dict[str, int] = {'openai': 10, 'events': 10, 'register': 5, 'message': 20}
+
+    @field_validator('quotas', mode='before')
+    @classmethod
+    def parse_quotas(cls, value: object) -> object:
+        return json.loads(value) if isinstance(value, str) else value
+
+
+class LogSinkConfig(BaseModel):
+    batch_size: int = 100
+    flush_interval: float = 5
+    max_queue_size: int = 10000
+    put_timeout: float = 0.5
+
+
+class CacheConfig(BaseModel):
+    maxsize: int = 10000
+    ttl: float = 300
+
+
+class CompletionCacheConfig(BaseModel):
+    enabled: bool = True
+    path: str = 'completion_cache.sqlite3'
+    maxsize: int = 1000
+    max_entries: int = 10000
+    ttl: float = 86400
+    # 0 disables the near-duplicate tier. When set, it only serves free-text prompts that opt in, never templated
+    # per-profile prompts, whose near-duplicates belong to other users.
+    similarity_threshold: float = 0
+    num_perm: int = 64
+    bands: int = 16
+    shingle_size: int = 2
+
+
+class MatchingConfig(BaseModel):
+    metric: str = 'cosine'
+    top_k: int = 3
+    explain: bool = False
+    page_size: int = 500
+
+
+class StreamingConfig(BaseModel):
+    enabled: bool = True
+    edit_interval: float = 1.0
+    group_edit_interval: float = 3.0
+
+
+class ConversationConfig(BaseModel):
+    enabled: bool = True
+    max_turns: int = 6
+    summarize_after: int = 4
+    max_prompt_tokens: int = 1500
+    summary_tokens: int = 200
+    max_chats: int = 10000
+    ttl: float = 24 * 3600
+    tokenizer: str = 'cl100k_base'
+
+
+class WorkerConfig(BaseModel):
+    concurrency: int = 8
+    max_depth: int = 1000
+    metrics_interval: float = 60
+
+
+class CounterConfig(BaseModel):
+    shards: int = 1
+    coalesce_interval: float = 0
+    maxsize: int = 10000
+
+
+class PrefetchConfig(BaseModel):
+    enabled: bool = True
+    buffer_size: int = 2
+    low_watermark: int = 0
+    max_users: int = 1000
+    budget_per_minute: float = 20
+    burst: float = 10
+
+
+class BatchingConfig(BaseModel):
+    enabled: bool = True
+    window: float = 0.05
+    max_batch: int = 8
+
+
+class DigestConfig(BaseModel):
+    # The daily run is scheduled by every process that enables it, so enable it on one replica only.
+    enabled: bool = False
+    hour: int = 9
+    minute: int = 0
+    page_size: int = 200
+    concurrency: int = 8
+    title: str = 'Your daily events:'
+
+
+class DedupConfig(BaseModel):
+    events: int = 3
+    overgenerate: int = 2
+    max_attempts: int = 3
+
+
+class MetricsConfig(BaseModel):
+    enabled: bool = True
+    # The endpoint is unauthenticated; bind a wider address only where the network keeps it private.
+    host: str = '127.0.0.1'
+    port: int = 9090
+    slow_request_threshold: float = 5.0
+    profile_slow_requests: bool = False
+    profile_interval: float = 0.01
+
+
+class StartupConfig(BaseModel):
+    warm_up: bool = True
 
 
 class AppConfig(BaseSettings):
     telegram: TelegramConfig
     chatgpt: ChatGPTConfig
     redis: RedisConfig
+    storage: StorageConfig = StorageConfig()
+    rate_limit: RateLimitConfig = RateLimitConfig()
+    log_sink: LogSinkConfig = LogSinkConfig()
+    user_cache: CacheConfig = CacheConfig()
+    completion_cache: CompletionCacheConfig = CompletionCacheConfig()
+    matching: MatchingConfig = MatchingConfig()
+    streaming: StreamingConfig = StreamingConfig()
+    sender: SenderConfig = SenderConfig()
+    conversation: ConversationConfig = ConversationConfig()
+    workers: WorkerConfig = WorkerConfig()
+    counter: CounterConfig = CounterConfig()
+    prefetch: PrefetchConfig = PrefetchConfig()
+    batching: BatchingConfig = BatchingConfig()
+    dedup: DedupConfig = DedupConfig()
+    digest: DigestConfig = DigestConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    startup: StartupConfig = StartupConfig()
     app_url: str
     app_port: int = Field(alias='PORT')
 
@@ -46,4 +241,13 @@ class AppConfig(BaseSettings):
         return cls(**data)
 
 
-config = AppConfig.from_ini()
+@functools.cache
+def get_config() -> AppConfig:
+    return AppConfig.from_ini()
+
+
+def __getattr__(name: str) -> AppConfig:
+    # `from pybot.setting import config` keeps working, but the .ini file is only read on first access.
+    if name == 'config':
+        return get_config()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers that use the same key.
+
+    The call runs as its own task and every caller awaits it through ``asyncio.shield``, so a caller that gives up
+    (e.g. a cancelled handler) does not cancel the work for the others. Keys are forgotten as soon as the call
+    finishes; this is coalescing, not caching.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: dict[Hashable, asyncio.Task[Any]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task[Any]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # marks the exception retrieved when every caller has gone away
+
+    def stats(self) -> dict[str, int]:
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'inflight': len(self._inflight)}
@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+from datetime import UTC, datetime
+
+from pybot.bloom import BloomFilter, normalize_name
+from pybot.model import Event, RequestLog, UserProfile
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, profile TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS event_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    link TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS event_history_username ON event_history (username, id);
+CREATE TABLE IF NOT EXISTS seen_events (username TEXT PRIMARY KEY, bloom BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, count INTEGER NOT NULL, timestamp TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS payloads (key TEXT PRIMARY KEY, content TEXT NOT NULL, timestamp TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value TEXT NOT NULL, timestamp TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS request_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    command TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS request_logs_username ON request_logs (username, timestamp);
+"""
+
+
+class SQLiteRepository:
+    """Embedded storage backend with the same semantics as ``FirebaseRepository``.
+
+    A file path gives a durable single-node deployment; ``':memory:'`` keeps everything in-process, which is what
+    offline benchmarks use. One connection is shared behind a lock, so every method is safe to call from the
+    ``AsyncRepository`` thread pool.
+    """
+
+    def __init__(self, path: str = ':memory:', history_limit: int = 60, bloom_bits: int = 8192, bloom_hashes: int = 6):
+        self.history_limit = history_limit
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+
+    def save_user(self, user: UserProfile) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO users VALUES (?, ?)', (user.username, user.model_dump_json()))
+
+    def get_user(self, name: str) -> UserProfile | None:
+        with self._lock:
+            row = self._conn.execute('SELECT profile FROM users WHERE username = ?', (name,)).fetchone()
+        return UserProfile.model_validate_json(row[0]) if row else None
+
+    def get_users_page(self, limit: int, start_after: str | None = None) -> list[UserProfile]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT profile FROM users WHERE username > ? ORDER BY username LIMIT ?', (start_after or '', limit)
+            ).fetchall()
+        return [UserProfile.model_validate_json(row[0]) for row in rows]
+
+    def save_events(self, username: str, events: list[Event]) -> None:
+        now = datetime.now(UTC).isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO event_history (username, name, date, link, timestamp) VALUES (?, ?, ?, ?, ?)',
+                [(username, event.name, event.date, event.link, now) for event in events],
+            )
+            self._conn.execute(
+                'DELETE FROM event_history WHERE username = ? AND id NOT IN '
+                '(SELECT id FROM event_history WHERE username = ? ORDER BY id DESC LIMIT ?)',
+                (username, username, self.history_limit),
+            )
+            row = self._conn.execute('SELECT bloom FROM seen_events WHERE username = ?', (username,)).fetchone()
+            seen = self.new_event_filter(row[0] if row else None)
+            for event in events:
+                seen.add(normalize_name(event.name))
+            self._conn.execute('INSERT OR REPLACE INTO seen_events VALUES (?, ?)', (username, seen.to_bytes()))
+
+    def get_past_events(self, username: str, limit: int = 60) -> list[Event]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT name, date, link FROM event_history WHERE username = ? ORDER BY id DESC LIMIT ?',
+                (username, limit),
+            ).fetchall()
+        return [Event(name=name, date=date, link=link) for name, date, link in rows]
+
+    def get_seen_events(self, username: str) -> BloomFilter:
+        with self._lock:
+            row = self._conn.execute('SELECT bloom FROM seen_events WHERE username = ?', (username,)).fetchone()
+        return self.new_event_filter(row[0] if row else None)
+
+    def new_event_filter(self, data: bytes | None = None) -> BloomFilter:
+        return BloomFilter(self.bloom_bits, self.bloom_hashes, data)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                'INSERT INTO counters VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET count = count + excluded.count, timestamp = excluded.timestamp '
+                'RETURNING count',
+                (key, amount, datetime.now(UTC).isoformat()),
+            ).fetchone()[0]
+
+    def get_count(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute('SELECT count FROM counters WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def rpush(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO payloads VALUES (?, ?, ?)', (key, value, datetime.now(UTC).isoformat())
+            )
+
+    def log_request(self, username: str, command: str, success: bool) -> None:
+        log = RequestLog(username=username, command=command, success=success, timestamp=datetime.now(UTC))
+        self.log_requests([log])
+
+    def log_requests(self, logs: list[RequestLog]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO request_logs (username, command, success, timestamp) VALUES (?, ?, ?, ?)',
+                [(log.username, log.command, log.success, log.timestamp.isoformat()) for log in logs],
+            )
+
+    def get_checkpoint(self, name: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def save_checkpoint(self, name: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)', (name, value, datetime.now(UTC).isoformat())
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,57 @@
+from typing import Protocol
+
+from pybot.bloom import BloomFilter
+from pybot.model import Event, RequestLog, UserProfile
+from pybot.setting import StorageBackend, StorageConfig
+
+
+class Repository(Protocol):
+    """Blocking storage operations the services rely on; ``AsyncRepository`` moves them off the event loop."""
+
+    def save_user(self, user: UserProfile) -> None: ...
+
+    def get_user(self, name: str) -> UserProfile | None: ...
+
+    def get_users_page(self, limit: int, start_after: str | None = None) -> list[UserProfile]: ...
+
+    def save_events(self, username: str, events: list[Event]) -> None: ...
+
+    def get_past_events(self, username: str, limit: int = 60) -> list[Event]: ...
+
+    def get_seen_events(self, username: str) -> BloomFilter: ...
+
+    def incr(self, key: str, amount: int = 1) -> int: ...
+
+    def get_count(self, key: str) -> int: ...
+
+    def rpush(self, key: str, value: str) -> None: ...
+
+    def log_request(self, username: str, command: str, success: bool) -> None: ...
+
+    def log_requests(self, logs: list[RequestLog]) -> None: ...
+
+    def get_checkpoint(self, name: str) -> str | None: ...
+
+    def save_checkpoint(self, name: str, value: str) -> None: ...
+
+
+def create_repository(config: StorageConfig, counter_shards: int = 1) -> Repository:
+    # Backends are imported lazily so an SQLite deployment never loads the Firebase SDK.
+    if config.backend == StorageBackend.SQLITE:
+        from pybot.sqlite_repository import SQLiteRepository
+
+        return SQLiteRepository(
+            config.path,
+            history_limit=config.history_limit,
+            bloom_bits=config.bloom_bits,
+            bloom_hashes=config.bloom_hashes,
+        )
+
+    from pybot.repository import FirebaseRepository
+
+    return FirebaseRepository(
+        counter_shards=counter_shards,
+        history_limit=config.history_limit,
+        bloom_bits=config.bloom_bits,
+        bloom_hashes=config.bloom_hashes,
+    )
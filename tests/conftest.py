@@ -0,0 +1,21 @@
+import pytest
+
+
+class FakeClock:
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    """Replaces ``time.monotonic`` and ``time.time``; only for tests that do not run an event loop."""
+    fake = FakeClock()
+    monkeypatch.setattr('time.monotonic', fake)
+    monkeypatch.setattr('time.time', fake)
+    return fake
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import time
+
+from pybot.model import Event, UserProfile
+from pybot.service.batching import EventBatcher
+from pybot.setting import BatchingConfig
+
+
+def event(name: str) -> Event:
+    return Event(name=name, date='2025-01-01', link='https://example.com')
+
+
+def test_batch_answers_each_user_and_falls_back_concurrently_for_the_rest():
+    async def main() -> None:
+        generated: list[str] = []
+
+        async def submit(prompt: str) -> str:
+            # Only the first user is in the answer.
+            return json.dumps({'1': [event('batched').model_dump()]})
+
+        async def generate_one(profile: UserProfile) -> list[Event]:
+            generated.append(profile.username)
+            await asyncio.sleep(0.05)
+            return [event(profile.username)]
+
+        batcher = EventBatcher(submit, generate_one, BatchingConfig(window=0.01, max_batch=10))
+        users = [UserProfile(username=f'user{i}', interests={'jazz'}) for i in range(4)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.generate(user) for user in users))
+        elapsed = time.perf_counter() - started
+
+        assert [events[0].name for events in results] == ['batched', 'user1', 'user2', 'user3']
+        assert sorted(generated) == ['user1', 'user2', 'user3']
+        assert elapsed < 0.12  # the three fallbacks overlapped instead of running one after another
+        await batcher.close()
+
+    asyncio.run(main())
+
+
+def test_a_failed_fallback_only_fails_its_own_callers():
+    async def main() -> None:
+        async def submit(prompt: str) -> str:
+            return 'Error: request timed out'
+
+        async def generate_one(profile: UserProfile) -> list[Event]:
+            if profile.username == 'bad':
+                raise RuntimeError('boom')
+            return [event(profile.username)]
+
+        batcher = EventBatcher(submit, generate_one, BatchingConfig(window=0.01, max_batch=10))
+        good, bad = await asyncio.gather(
+            batcher.generate(UserProfile(username='good', interests={'jazz'})),
+            batcher.generate(UserProfile(username='bad', interests={'jazz'})),
+            return_exceptions=True,
+        )
+        assert good[0].name == 'good'
+        assert isinstance(bad, RuntimeError)
+
+    asyncio.run(main())
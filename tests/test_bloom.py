@@ -0,0 +1,59 @@
+from pybot.bloom import BloomFilter, normalize_name
+
+
+def test_normalize_name():
+    assert normalize_name('  Jazz_Night: LIVE!! ') == 'jazz night live'
+
+
+def test_added_items_are_always_found():
+    bloom = BloomFilter()
+    names = [f'event {i}' for i in range(500)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+
+
+def test_false_positive_rate_is_low_below_capacity():
+    bloom = BloomFilter()
+    for i in range(300):
+        bloom.add(f'seen {i}')
+    false_positives = sum(f'unseen {i}' in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.01
+
+
+def test_round_trips_through_bytes():
+    bloom = BloomFilter()
+    bloom.add('jazz night')
+    restored = BloomFilter(bloom.size_bits, bloom.hashes, bloom.to_bytes())
+    assert 'jazz night' in restored
+    assert 'chess club' not in restored
+
+
+def test_ignores_data_of_the_wrong_size():
+    assert 'x' not in BloomFilter(8192, 6, b'\xff' * 16)
+
+
+def test_heavy_use_ages_out_old_items_instead_of_saturating():
+    bloom = BloomFilter()
+    for i in range(20 * bloom.capacity):
+        bloom.add(f'seen {i}')
+    recent = [f'seen {i}' for i in range(19 * bloom.capacity, 20 * bloom.capacity)]
+    assert all(name in bloom for name in recent)
+    false_positives = sum(f'unseen {i}' in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.05
+    forgotten = sum(f'seen {i}' not in bloom for i in range(bloom.capacity))
+    assert forgotten / bloom.capacity > 0.95
+
+
+def test_reads_a_single_generation_written_before_rotation():
+    legacy = bytearray(1024)
+    bloom = BloomFilter()
+    bloom.add('jazz night')
+    legacy[:] = bloom.bits
+    restored = BloomFilter(8192, 6, bytes(legacy))
+    assert 'jazz night' in restored
+    assert len(restored.to_bytes()) == 2048
+
+
+def test_drops_a_saturated_filter_from_before_rotation():
+    assert 'anything' not in BloomFilter(8192, 6, b'\xff' * 1024)
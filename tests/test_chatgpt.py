@@ -0,0 +1,98 @@
+import asyncio
+import sqlite3
+import time
+from typing import Any
+
+import pytest
+
+from pybot.service.chatgpt import ChatGPTService
+from pybot.service.completion_cache import CompletionCache
+from pybot.setting import ChatGPTConfig, CompletionCacheConfig
+
+
+class FakeResponse:
+    status_code = 200
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Any:
+        return {'choices': [{'message': {'content': 'reply'}}]}
+
+
+class SlowClient:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.posted: list[tuple[str, Any]] = []
+        self.closed = False
+
+    async def post(self, url: str, json: Any) -> FakeResponse:
+        self.posted.append((url, json))
+        await asyncio.sleep(self.latency)
+        return FakeResponse()
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+def service(latency: float, **overrides: Any) -> ChatGPTService:
+    settings = {'breaker_failure_threshold': 2, **overrides}
+    config = ChatGPTConfig(basicurl='http://llm', modelname='m', apiversion='v', access_token='t', **settings)
+    return ChatGPTService(config, SlowClient(latency))  # type: ignore[arg-type]
+
+
+def test_submit_runs_completions_concurrently_and_close_releases_the_client():
+    async def main() -> None:
+        llm = service(0.1, timeout=1)
+        llm.cache = CompletionCache(CompletionCacheConfig(path=':memory:'))
+        started = time.perf_counter()
+        replies = await asyncio.gather(*(llm.submit(f'prompt {i}', use_cache=False) for i in range(4)))
+        # Four calls of 0.1s share the event loop instead of queueing behind each other.
+        assert time.perf_counter() - started < 0.3
+        assert replies == ['reply'] * 4
+        url, payload = llm.client.posted[0]
+        assert url == 'http://llm/deployments/m/chat/completions/?api-version=v'
+        assert payload['messages'][-1] == {'role': 'user', 'content': 'prompt 0'}
+
+        assert await llm.submit('slow', timeout=0.01, use_cache=False) == 'Error: request timed out'
+        slow = service(0.1, timeout=0.01)
+        assert await slow.submit('slow', use_cache=False) == 'Error: request timed out'
+
+        await llm.close()
+        assert llm.client.closed
+        with pytest.raises(sqlite3.ProgrammingError):
+            await llm.cache.get('prompt 0')
+
+    asyncio.run(main())
+
+
+def test_timeouts_while_queued_for_a_slot_do_not_open_the_breaker():
+    async def main() -> None:
+        llm = service(0.2, initial_concurrency=1, min_concurrency=1, max_concurrency=1)
+        replies = await asyncio.gather(*(llm.submit(f'prompt {i}', timeout=0.05, use_cache=False) for i in range(6)))
+        assert all(reply == 'Error: request timed out' for reply in replies)
+        assert llm.breaker.state == 'closed'
+        assert await llm.submit('later', use_cache=False) == 'reply'
+
+    asyncio.run(main())
+
+
+def test_fallback_serves_only_exact_plain_prompts():
+    async def main() -> None:
+        cache = CompletionCache(CompletionCacheConfig(path=':memory:', similarity_threshold=0.5))
+        llm = service(0)
+        llm.cache = cache
+        await cache.set('tell me about jazz concerts in hong kong this weekend', 'cached')
+        llm.breaker.record_failure()
+        llm.breaker.record_failure()
+        assert llm.breaker.state == 'open'
+
+        assert await llm._complete('tell me about jazz concerts in hong kong this weekend', None) == 'cached'
+        unavailable = 'Error: service temporarily unavailable'
+        assert await llm._complete('tell me about jazz concerts in hong kong this weekend please', None) == unavailable
+        assert await llm._complete('tell me about jazz concerts in hong kong this weekend', None, True) == unavailable
+        history = [{'role': 'user', 'content': 'tell me about jazz concerts in hong kong this weekend'}]
+        assert await llm._complete(history[0]['content'], None, messages=history) == unavailable
+        cache.close()
+
+    asyncio.run(main())
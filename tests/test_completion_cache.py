@@ -0,0 +1,92 @@
+import asyncio
+
+from pybot.service.completion_cache import CompletionCache, MinHasher, MinHashIndex, normalize_prompt, prompt_key
+from pybot.setting import CompletionCacheConfig
+
+
+def test_normalized_prompts_share_a_key():
+    assert prompt_key(normalize_prompt('Hello   World')) == prompt_key(normalize_prompt('hello world'))
+
+
+def test_similarity_tracks_overlap():
+    hasher = MinHasher()
+    base = hasher.signature(normalize_prompt('recommend three jazz concerts in hong kong this weekend please'))
+    close = hasher.signature(normalize_prompt('recommend three jazz concerts in hong kong this weekend, please!'))
+    far = hasher.signature(normalize_prompt('write a python function that reverses a linked list'))
+    assert MinHasher.similarity(base, base) == 1.0
+    assert MinHasher.similarity(base, close) > 0.8
+    assert MinHasher.similarity(base, far) < 0.2
+
+
+def test_index_returns_near_duplicates_only():
+    hasher = MinHasher()
+    index = MinHashIndex(hasher)
+    prompt = normalize_prompt('recommend three jazz concerts in hong kong this weekend please')
+    index.add('jazz', hasher.signature(prompt))
+    index.add('python', hasher.signature(normalize_prompt('write a python function that reverses a linked list')))
+
+    assert index.query(hasher.signature(prompt + ' thanks'), 0.7) == 'jazz'
+    assert index.query(hasher.signature(normalize_prompt('what is the capital of france')), 0.7) is None
+
+
+def test_index_remove_and_replace():
+    hasher = MinHasher()
+    index = MinHashIndex(hasher)
+    signature = hasher.signature('some prompt text here')
+    index.add('a', signature)
+    index.add('a', signature)
+    assert len(index) == 1
+    index.remove('a')
+    assert 'a' not in index
+    assert index.query(signature, 0.5) is None
+    index.remove('a')
+
+
+def test_near_duplicates_are_served_only_when_asked_for():
+    async def main() -> None:
+        cache = CompletionCache(CompletionCacheConfig(path=':memory:', similarity_threshold=0.7))
+        await cache.set('recommend three jazz concerts in hong kong this weekend please', 'reply')
+        near = 'recommend three jazz concerts in hong kong this weekend please thanks'
+        assert await cache.get('Recommend three jazz concerts in Hong Kong this weekend please') == 'reply'
+        assert await cache.get(near) is None
+        assert await cache.get(near, similar=True) == 'reply'
+        cache.close()
+
+    asyncio.run(main())
+
+
+def test_similarity_tier_is_off_by_default():
+    assert not CompletionCacheConfig().similarity_threshold
+
+
+def test_persisted_entries_are_indexed_without_warm_up(tmp_path):
+    async def main() -> None:
+        config = CompletionCacheConfig(path=str(tmp_path / 'cache.sqlite3'), similarity_threshold=0.7)
+        first = CompletionCache(config)
+        await first.set('recommend three jazz concerts in hong kong this weekend please', 'reply')
+        first.close()
+
+        restarted = CompletionCache(config)
+        near = 'recommend three jazz concerts in hong kong this weekend please thanks'
+        assert await restarted.get(near, similar=True) == 'reply'
+        restarted.close()
+
+    asyncio.run(main())
+
+
+def test_eviction_counts_rows_already_in_the_store(tmp_path):
+    async def main() -> None:
+        config = CompletionCacheConfig(path=str(tmp_path / 'cache.sqlite3'), max_entries=10)
+        first = CompletionCache(config)
+        for i in range(10):
+            await first.set(f'prompt number {i}', 'reply')
+        first.close()
+
+        restarted = CompletionCache(config)
+        for i in range(10, 15):
+            await restarted.set(f'prompt number {i}', 'reply')
+        assert restarted.store.count() <= 10
+        assert await restarted.get('prompt number 14') == 'reply'
+        restarted.close()
+
+    asyncio.run(main())
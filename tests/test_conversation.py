@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from pybot.service.conversation import MESSAGE_OVERHEAD, REPLY_OVERHEAD, ConversationMemory, Tokenizer, trim_to_budget
+from pybot.setting import ConversationConfig
+
+
+@pytest.fixture
+def tokenizer() -> Tokenizer:
+    tokenizer = Tokenizer()
+    tokenizer._encoding = None  # the local estimate, whether or not tiktoken is installed
+    return tokenizer
+
+
+def turns(count: int) -> list[dict[str, str]]:
+    messages = []
+    for i in range(count):
+        messages.append({'role': 'user', 'content': f'question {i} ' * 5})
+        messages.append({'role': 'assistant', 'content': f'answer {i} ' * 5})
+    return messages
+
+
+def test_estimate_and_truncate(tokenizer):
+    assert tokenizer.count('Hello, world!') == 6
+    assert tokenizer.count('internationalization') == 5
+    assert tokenizer.truncate('one two three four', 2) == 'one two'
+    assert tokenizer.truncate('short', 10) == 'short'
+
+
+def test_everything_fits(tokenizer):
+    context = [{'role': 'system', 'content': 'summary'}, *turns(2)]
+    assert trim_to_budget(tokenizer, context, 'hi', 1000) == [*context, {'role': 'user', 'content': 'hi'}]
+
+
+def test_keeps_the_newest_turns_within_budget(tokenizer):
+    context = turns(10)
+    budget = 120
+    messages = trim_to_budget(tokenizer, context, 'next question', budget)
+    assert tokenizer.count_messages(messages) <= budget
+    assert messages[-1] == {'role': 'user', 'content': 'next question'}
+    assert messages[-2] == context[-1]
+    assert messages[0]['role'] == 'user'  # never starts with an orphaned reply
+    assert messages[:-1] == context[len(context) - len(messages) + 1 :]
+
+
+def test_summary_is_kept_ahead_of_older_turns(tokenizer):
+    context = [{'role': 'system', 'content': 'the user likes jazz'}, *turns(10)]
+    messages = trim_to_budget(tokenizer, context, 'more?', 80)
+    assert messages[0] == context[0]
+    assert tokenizer.count_messages(messages) <= 80
+
+
+def test_oversized_message_is_truncated(tokenizer):
+    messages = trim_to_budget(tokenizer, turns(3), 'word ' * 500, 50)
+    assert len(messages) == 1
+    assert tokenizer.count_messages(messages) <= 50
+    assert MESSAGE_OVERHEAD + REPLY_OVERHEAD < 50
+
+
+class FakeChatGPT:
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def submit(self, message: str, **_: object) -> str:
+        self.prompts.append(message)
+        return 'the user asked about jazz'
+
+
+def memory(chatgpt: FakeChatGPT, **overrides: object) -> ConversationMemory:
+    config = ConversationConfig(**{'max_turns': 2, 'summarize_after': 3, 'max_prompt_tokens': 300, **overrides})
+    conversations = ConversationMemory(chatgpt, config)  # type: ignore[arg-type]
+    conversations.tokenizer._encoding = None
+    return conversations
+
+
+def test_first_message_has_no_context():
+    assert memory(FakeChatGPT()).prompt(1, 'hello') is None
+
+
+def test_summary_only_drops_the_exchanges_it_covered():
+    async def main() -> None:
+        chatgpt = FakeChatGPT()
+        conversations = memory(chatgpt)
+        for i in range(5):
+            conversations.record(1, f'question {i} ' + 'word ' * 40, f'answer {i} ' + 'word ' * 40)
+        await asyncio.gather(*conversations._summarizing.values())
+
+        conversation = conversations._chats.get(1)
+        # Three exchanges were evicted but only two fit in the summarization prompt; the third is kept for later.
+        assert len(chatgpt.prompts) == 1
+        assert conversations.tokenizer.count(chatgpt.prompts[0]) <= 300
+        assert 'question 0' in chatgpt.prompts[0] and 'question 1' in chatgpt.prompts[0]
+        assert 'question 2' not in chatgpt.prompts[0]
+        assert [user.split()[:2] for user, _ in conversation.evicted] == [['question', '2']]
+        assert conversation.summary == 'the user asked about jazz'
+
+        messages = conversations.prompt(1, 'next')
+        assert messages is not None
+        assert messages[0]['role'] == 'system'
+
+    asyncio.run(main())
+
+
+def test_an_oversized_exchange_is_cut_rather_than_blocking_the_summary():
+    async def main() -> None:
+        chatgpt = FakeChatGPT()
+        conversations = memory(chatgpt, summarize_after=1)
+        for i in range(3):
+            conversations.record(1, f'question {i} ' + 'word ' * 400, 'ok')
+        await asyncio.gather(*conversations._summarizing.values())
+        assert conversations.tokenizer.count(chatgpt.prompts[0]) <= 300
+        assert conversations._chats.get(1).evicted == []
+
+    asyncio.run(main())
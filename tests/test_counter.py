@@ -0,0 +1,131 @@
+import asyncio
+
+from pybot.counter import KeywordCounter
+from pybot.redis_state import RedisCounterStore
+from pybot.setting import CounterConfig
+
+
+class SlowStore:
+    def __init__(self, counts: dict[str, int] | None = None):
+        self.counts = dict(counts or {})
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        await asyncio.sleep(0.01)
+        self.counts[key] = self.counts.get(key, 0) + amount
+        return self.counts[key]
+
+    async def incr_many(self, deltas: dict[str, int]) -> dict[str, int]:
+        return {key: await self.incr(key, amount) for key, amount in deltas.items()}
+
+    async def get_count(self, key: str) -> int:
+        await asyncio.sleep(0.01)
+        return self.counts.get(key, 0)
+
+
+def test_concurrent_increments_get_distinct_counts():
+    async def main() -> None:
+        store = SlowStore({'jazz': 10})
+        counter = KeywordCounter(store, CounterConfig(coalesce_interval=60))
+        first = await asyncio.gather(*(counter.incr('jazz') for _ in range(5)))
+        flush = asyncio.create_task(counter.flush())
+        await asyncio.sleep(0)
+        # Increments made while a flush is in flight still count what is being flushed.
+        during = await asyncio.gather(*(counter.incr('jazz') for _ in range(3)))
+        await flush
+        after = await counter.incr('jazz')
+        await counter.close()
+        assert sorted(first) == [11, 12, 13, 14, 15]
+        assert sorted(during) == [16, 17, 18]
+        assert after == 19
+        assert store.counts['jazz'] == 19
+
+    asyncio.run(main())
+
+
+def test_failed_flush_keeps_the_increments():
+    async def main() -> None:
+        store = SlowStore()
+        counter = KeywordCounter(store, CounterConfig(coalesce_interval=60))
+        await counter.incr('jazz')
+
+        async def fail(_: dict[str, int]) -> dict[str, int]:
+            raise RuntimeError('unavailable')
+
+        store.incr_many = fail  # type: ignore[method-assign]
+        await counter.flush()
+        assert await counter.incr('jazz') == 2
+
+    asyncio.run(main())
+
+
+class FakePipeline:
+    def __init__(self, redis: 'FakeRedis'):
+        self.redis = redis
+        self.commands: list[tuple[str, tuple[object, ...], dict[str, object]]] = []
+
+    async def __aenter__(self) -> 'FakePipeline':
+        return self
+
+    async def __aexit__(self, *_: object) -> None:
+        pass
+
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self) -> list[object]:
+        if self.redis.fail:
+            raise ConnectionError('redis unavailable')
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values: dict[str, int] = {}
+        self.fail = False
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def exists(self, key: str) -> int:
+        return int(key in self.values)
+
+    async def set(self, key: str, value: int, nx: bool = False) -> bool:
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def incrby(self, key: str, amount: int) -> int:
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    async def get(self, key: str) -> int | None:
+        return self.values.get(key)
+
+
+def test_redis_counters_start_from_the_repository_counts():
+    async def main() -> None:
+        redis = FakeRedis()
+        store = RedisCounterStore(redis, SlowStore({'jazz': 10}))  # type: ignore[arg-type]
+        assert await store.incr('jazz') == 11
+        assert await store.incr_many({'jazz': 2, 'rock': 1}) == {'jazz': 13, 'rock': 1}
+        # Another replica that seeds the same key later does not overwrite the shared count.
+        assert await RedisCounterStore(redis, SlowStore({'jazz': 10})).get_count('jazz') == 13  # type: ignore[arg-type]
+
+    asyncio.run(main())
+
+
+def test_redis_flush_errors_keep_the_increments():
+    async def main() -> None:
+        redis = FakeRedis()
+        store = RedisCounterStore(redis, SlowStore())  # type: ignore[arg-type]
+        counter = KeywordCounter(store, CounterConfig(coalesce_interval=60))
+        await counter.incr('jazz')
+        redis.fail = True
+        await counter.flush()
+        redis.fail = False
+        assert await counter.incr('jazz') == 2
+        await counter.flush()
+        assert redis.values['pybot:counter:jazz'] == 2
+
+    asyncio.run(main())
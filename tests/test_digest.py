@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from pybot.async_repository import AsyncRepository
+from pybot.digest import DigestBroadcaster
+from pybot.model import Event, UserProfile
+from pybot.service.event import EventService
+from pybot.service.event_parser import format_events
+from pybot.service.user import UserService
+from pybot.setting import BatchingConfig, CacheConfig, DedupConfig, DigestConfig, MatchingConfig, PrefetchConfig
+from pybot.sqlite_repository import SQLiteRepository
+
+
+class Crash(BaseException):
+    """Stands in for the process dying: unlike ``Exception`` it is not swallowed per user."""
+
+
+class FakeEventService:
+    async def digest_events(self, user: UserProfile) -> list[Event]:
+        return [Event(name=f'event for {user.username}', date='2026-01-01', link='https://example.com')]
+
+
+class FakeChatGPT:
+    def __init__(self, names: list[str]):
+        self.names = names
+        self.cached_calls = 0
+
+    async def submit(self, prompt: str, use_cache: bool = True, **_: object) -> str:
+        self.cached_calls += use_cache
+        return format_events([Event(name=name, date='2026-01-01', link='https://example.com') for name in self.names])
+
+
+class FakeSender:
+    def __init__(self, crash_at: int | None = None):
+        self.crash_at = crash_at
+        self.sent: list[int] = []
+
+    async def send(self, chat_id: int, text: str, *_: object, **__: object) -> list[object]:
+        if len(self.sent) == self.crash_at:
+            raise Crash()
+        self.sent.append(chat_id)
+        return []
+
+
+@pytest.fixture
+def repo():
+    repo = AsyncRepository(SQLiteRepository(':memory:'), max_workers=1)
+    for i in range(10):
+        repo.repo.save_user(UserProfile(username=f'user{i:02}', interests={'jazz'}, chat_id=i))
+    repo.repo.save_user(UserProfile(username='nointerests', interests=set(), chat_id=99))
+    repo.repo.save_user(UserProfile(username='nochat', interests={'jazz'}))
+    yield repo
+    repo.close()
+
+
+def broadcaster(repo: AsyncRepository, sender: FakeSender) -> DigestBroadcaster:
+    config = DigestConfig(page_size=4, concurrency=2)
+    return DigestBroadcaster(repo, FakeEventService(), sender, config)  # type: ignore[arg-type]
+
+
+def test_run_delivers_once_and_skips_users_it_cannot_reach(repo):
+    sender = FakeSender()
+    digest = broadcaster(repo, sender)
+    asyncio.run(digest.run('2026-01-01'))
+    assert sorted(sender.sent) == list(range(10))
+    assert digest.stats() == {'running': False, 'sent': 10, 'skipped': 1, 'unreachable': 1, 'failed': 0}
+
+    # A finished run is not repeated.
+    asyncio.run(digest.run('2026-01-01'))
+    assert len(sender.sent) == 10
+
+
+def test_resume_continues_after_the_last_finished_page(repo):
+    # Pages of four in username order: (nochat, nointerests, 0, 1), (2..5), (6..9); the crash hits the third.
+    crashing = FakeSender(crash_at=5)
+    with pytest.raises(Crash):
+        asyncio.run(broadcaster(repo, crashing).run('2026-01-01'))
+    assert sorted(crashing.sent) == [0, 1, 2, 3, 4]
+
+    sender = FakeSender()
+    asyncio.run(broadcaster(repo, sender).run('2026-01-01'))
+    # Only the page that was in progress is repeated.
+    assert sorted(sender.sent) == [2, 3, 4, 5, 6, 7, 8, 9]
+
+
+def test_a_new_day_starts_from_the_beginning(repo):
+    asyncio.run(broadcaster(repo, FakeSender()).run('2026-01-01'))
+    sender = FakeSender()
+    asyncio.run(broadcaster(repo, sender).run('2026-01-02'))
+    assert sorted(sender.sent) == list(range(10))
+
+
+def test_registered_users_pick_up_their_chat_on_any_message(repo):
+    async def main() -> None:
+        users = UserService(None, repo, CacheConfig(), MatchingConfig())  # type: ignore[arg-type]
+        await users.remember_chat('nochat', 42)
+        await users.remember_chat('stranger', 43)
+        assert (await repo.get_user('nochat')).chat_id == 42
+        assert await repo.get_user('stranger') is None
+
+        sender = FakeSender()
+        await broadcaster(repo, sender).run('2026-01-01')
+        assert 42 in sender.sent
+
+    asyncio.run(main())
+
+
+def test_digest_events_are_uncached_and_skip_events_the_user_has_seen(repo):
+    async def main() -> None:
+        chatgpt = FakeChatGPT(['Jazz Night', 'Blues Jam', 'Swing Class', 'Bebop Talk', 'Jam Session'])
+        events = EventService(
+            chatgpt,  # type: ignore[arg-type]
+            repo,
+            PrefetchConfig(enabled=False),
+            BatchingConfig(enabled=False),
+            DedupConfig(),
+        )
+        user = await repo.get_user('user00')
+        await repo.save_events('user00', [Event(name='Jazz night!', date='2025-12-31', link='https://example.com')])
+
+        digest = await events.digest_events(user)
+        assert [event.name for event in digest] == ['Blues Jam', 'Swing Class', 'Bebop Talk']
+        assert chatgpt.cached_calls == 0
+        # What the digest sent is remembered, so the next one only has the event it left out.
+        assert [event.name for event in await events.digest_events(user)] == ['Jam Session']
+
+    asyncio.run(main())
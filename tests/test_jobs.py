@@ -0,0 +1,54 @@
+import asyncio
+
+from pybot.jobs import BackgroundJobQueue, Priority, Submission
+from pybot.setting import WorkerConfig
+
+
+def test_submit_reports_duplicates_and_overflow():
+    async def main() -> None:
+        jobs = BackgroundJobQueue(WorkerConfig(concurrency=1, max_depth=2))
+        release = asyncio.Event()
+
+        async def wait() -> None:
+            await release.wait()
+
+        assert jobs.submit('a', wait) is Submission.ACCEPTED
+        assert jobs.submit('a', wait) is Submission.DEDUPLICATED
+        assert jobs.submit('b', wait) is Submission.ACCEPTED
+        assert jobs.submit('c', wait) is Submission.REJECTED
+        metrics = jobs.metrics()
+        assert (metrics['submitted'], metrics['deduplicated'], metrics['rejected']) == (2, 1, 1)
+
+        jobs.start()
+        release.set()
+        await jobs.queue.join()
+        assert jobs.submit('a', wait) is Submission.ACCEPTED
+        await jobs.queue.join()
+        await jobs.close()
+
+    asyncio.run(main())
+
+
+def test_failed_jobs_are_counted_and_run_in_priority_order():
+    async def main() -> None:
+        jobs = BackgroundJobQueue(WorkerConfig(concurrency=1))
+        order: list[str] = []
+
+        def job(name: str, fail: bool = False):
+            async def run() -> None:
+                order.append(name)
+                if fail:
+                    raise RuntimeError(name)
+
+            return run
+
+        jobs.submit('low', job('low'), Priority.LOW)
+        jobs.submit('broken', job('broken', fail=True))
+        jobs.submit('high', job('high'), Priority.HIGH)
+        jobs.start()
+        await jobs.queue.join()
+        await jobs.close()
+        assert order == ['high', 'broken', 'low']
+        assert (jobs.completed, jobs.failed) == (2, 1)
+
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import asyncio
+
+from pybot.logsink import RequestLogSink
+from pybot.model import RequestLog
+from pybot.setting import LogSinkConfig
+
+
+class SlowRepo:
+    def __init__(self):
+        self.written: list[RequestLog] = []
+        self.writing = asyncio.Event()
+
+    async def log_requests(self, logs: list[RequestLog]) -> None:
+        self.writing.set()
+        await asyncio.sleep(0.05)
+        self.written.extend(logs)
+
+
+def test_close_waits_for_the_batch_being_written():
+    async def main() -> None:
+        repo = SlowRepo()
+        sink = RequestLogSink(repo, LogSinkConfig(batch_size=2))  # type: ignore[arg-type]
+        sink.start()
+        for i in range(3):
+            await sink.submit(f'user{i}', 'help', True)
+        await repo.writing.wait()
+        await sink.close()
+        assert sorted(log.username for log in repo.written) == ['user0', 'user1', 'user2']
+
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import asyncio
+
+from pybot.messaging import MAX_MESSAGE_LENGTH, MessageSender, split_text
+from pybot.setting import SenderConfig
+
+
+def test_short_text_is_one_part():
+    assert split_text('hello') == ['hello']
+    assert split_text('') == ['']
+
+
+def test_splits_on_newline_then_space():
+    assert split_text('aaaa\nbbbb cc', limit=6) == ['aaaa', 'bbbb', 'cc']
+
+
+def test_hard_splits_words_longer_than_the_limit():
+    assert split_text('x' * 10, limit=4) == ['xxxx', 'xxxx', 'xx']
+
+
+def test_parts_respect_the_telegram_limit_and_keep_the_words():
+    text = ' '.join(f'word{i}' for i in range(2000))
+    parts = split_text(text)
+    assert len(parts) > 1
+    assert all(len(part) <= MAX_MESSAGE_LENGTH for part in parts)
+    assert ' '.join(parts) == text
+
+
+class FakeBot:
+    def __init__(self, fail_chats: frozenset[int] = frozenset()):
+        self.fail_chats = fail_chats
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **_: object) -> tuple[int, str]:
+        await asyncio.sleep(0)
+        if chat_id in self.fail_chats:
+            raise RuntimeError('blocked')
+        self.sent.append((chat_id, text))
+        return chat_id, text
+
+
+def test_post_queues_without_waiting_and_counts_failures():
+    async def main() -> None:
+        bot = FakeBot(fail_chats=frozenset({2}))
+        sender = MessageSender(SenderConfig(), bot)  # type: ignore[arg-type]
+        assert sender.post(1, 'hello') is None
+        sender.post(2, 'lost')
+        assert bot.sent == []
+        await sender.send(1, 'after')
+        await asyncio.sleep(0.01)
+        assert bot.sent == [(1, 'hello'), (1, 'after')]
+        assert sender.stats()['failed'] == 1
+        await sender.close()
+
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+import asyncio
+
+from pybot.model import Event, UserProfile
+from pybot.service.prefetch import RecommendationPrefetcher
+from pybot.setting import PrefetchConfig
+
+
+def test_only_profile_changes_drop_the_buffer():
+    async def main() -> None:
+        calls: list[UserProfile] = []
+
+        async def generate(user: UserProfile) -> list[Event]:
+            calls.append(user)
+            return [Event(name=f'event {len(calls)}', date='2026-01-01', link='https://example.com')]
+
+        prefetcher = RecommendationPrefetcher(generate, PrefetchConfig(buffer_size=1))
+        user = UserProfile(username='alice', interests={'jazz'})
+        prefetcher.invalidate(user)
+        await asyncio.sleep(0)
+        assert len(calls) == 1
+
+        # Recording the chat id keeps the buffered events and spends nothing.
+        prefetcher.invalidate(user.model_copy(update={'chat_id': 42}))
+        await asyncio.sleep(0)
+        assert len(calls) == 1
+
+        prefetcher.invalidate(user.model_copy(update={'interests': {'jazz', 'blues'}}))
+        await asyncio.sleep(0)
+        assert len(calls) == 2
+        events = prefetcher.take(user.model_copy(update={'interests': {'jazz', 'blues'}}))
+        assert [event.name for event in events or []] == ['event 2']
+        await prefetcher.close()
+
+    asyncio.run(main())
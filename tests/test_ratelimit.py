@@ -0,0 +1,68 @@
+import asyncio
+
+from pybot.ratelimit import SlidingWindowRateLimiter, TokenBucket
+from pybot.setting import RateLimitConfig
+
+
+def test_token_bucket_allows_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.delay() == 0.5
+    clock.advance(0.5)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    clock.advance(60)
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_sliding_window_enforces_quota_per_key(clock):
+    limiter = SlidingWindowRateLimiter(RateLimitConfig(window=60, default_quota=3, quotas={'events': 1}))
+    assert [limiter.allow('alice', 'help') for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow('alice', 'events')
+    assert not limiter.allow('alice', 'events')
+    assert limiter.allow('bob', 'events')
+
+
+def test_sliding_window_weighs_previous_window(clock):
+    limiter = SlidingWindowRateLimiter(RateLimitConfig(window=60, default_quota=4, quotas={}))
+    clock.now = 60 * 100
+    assert all(limiter.allow('alice', 'help') for _ in range(4))
+    # A quarter into the next window, three quarters of the previous count still overlap the sliding window.
+    clock.advance(60 + 15)
+    assert limiter.allow('alice', 'help')
+    assert not limiter.allow('alice', 'help')
+    clock.advance(45)
+    assert limiter.allow('alice', 'help')
+
+
+class MemoryStore:
+    def __init__(self):
+        self.totals: dict[tuple[int, str], int] = {}
+
+    async def exchange(self, window: int, deltas: dict[str, int]) -> dict[str, int]:
+        for key, delta in deltas.items():
+            self.totals[window, key] = self.totals.get((window, key), 0) + delta
+        return {key: total for (index, key), total in self.totals.items() if index == window}
+
+
+def test_replicas_with_different_monotonic_clocks_share_one_window(monkeypatch):
+    # Each host's monotonic clock starts at an arbitrary point; only wall-clock time is common to the replicas.
+    monkeypatch.setattr('time.time', lambda: 1_700_000_010.0)
+    store = MemoryStore()
+    config = RateLimitConfig(window=60, default_quota=3, quotas={})
+
+    monkeypatch.setattr('time.monotonic', lambda: 5.0)
+    first = SlidingWindowRateLimiter(config, store)
+    assert first.allow('alice', 'help') and first.allow('alice', 'help')
+    asyncio.run(first.sync())
+
+    monkeypatch.setattr('time.monotonic', lambda: 987_654.0)
+    second = SlidingWindowRateLimiter(config, store)
+    asyncio.run(second.sync())
+    assert second.allow('alice', 'help')
+    assert not second.allow('alice', 'help')
+    assert len({index for index, _ in store.totals}) == 1
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+from pybot.resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, backoff_delay, retry_after_delay
+
+
+def test_backoff_delay_is_bounded_by_cap():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2**attempt)
+
+
+def test_retry_after_delay_formats():
+    assert retry_after_delay({'retry-after-ms': '250'}) == 0.25
+    assert retry_after_delay({'retry-after': '3'}) == 3.0
+    assert retry_after_delay({'retry-after': '-5'}) == 0.0
+    assert retry_after_delay({}) is None
+    assert retry_after_delay({'retry-after': 'soon'}) is None
+    date = format_datetime(datetime.now(UTC) + timedelta(seconds=30), usegmt=True)
+    assert 25 < retry_after_delay({'retry-after': date}) <= 30
+
+
+def test_retry_after_ms_takes_precedence():
+    assert retry_after_delay({'retry-after-ms': '1500', 'retry-after': '10'}) == 1.5
+
+
+def test_limiter_grows_additively_and_backs_off_multiplicatively(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial=4, minimum=1, maximum=8, latency_target=1.0, cooldown=1.0)
+    limiter.record(0.1)
+    assert limiter.limit == 4.25
+    limiter.record(0.1, overloaded=True)
+    assert limiter.limit == 2.125
+    # A burst of overload signals within the cooldown only halves the limit once.
+    limiter.record(0.1, overloaded=True)
+    limiter.record(5.0)
+    assert limiter.limit == 2.125
+    clock.advance(1.0)
+    limiter.record(5.0)
+    assert limiter.limit == 1.0625
+    clock.advance(1.0)
+    limiter.record(0.1, overloaded=True)
+    assert limiter.limit == 1.0
+    assert limiter.decreases == 3
+
+
+def test_limiter_is_clamped_to_maximum():
+    limiter = AdaptiveConcurrencyLimiter(initial=20, minimum=1, maximum=3, latency_target=1.0)
+    assert limiter.limit == 3
+    for _ in range(10):
+        limiter.record(0.1)
+    assert limiter.limit == 3
+
+
+def test_limiter_caps_concurrency():
+    async def main() -> int:
+        limiter = AdaptiveConcurrencyLimiter(initial=2, minimum=1, maximum=2, latency_target=1.0)
+        active = peak = 0
+
+        async def call() -> None:
+            nonlocal active, peak
+            async with limiter:
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        assert limiter.in_flight == 0
+        return peak
+
+    assert asyncio.run(main()) == 2
+
+
+def test_breaker_opens_after_threshold_and_probes_once(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    clock.advance(10)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    clock.advance(10)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.stats()['opens'] == 2
+
+
+def test_breaker_replaces_a_stale_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    clock.advance(5)
+    assert breaker.allow()
+    clock.advance(5)
+    assert breaker.allow()
+
+
+def test_breaker_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from pybot.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def main() -> None:
+        flight = SingleFlight()
+        runs = 0
+
+        async def work() -> int:
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        assert await asyncio.gather(*(flight.do('k', work) for _ in range(5))) == [42] * 5
+        assert runs == 1
+        assert flight.stats() == {'calls': 5, 'coalesced': 4, 'inflight': 0}
+
+        # Finished keys are forgotten: this is coalescing, not caching.
+        assert await flight.do('k', work) == 42
+        assert runs == 2
+
+    asyncio.run(main())
+
+
+def test_distinct_keys_run_separately():
+    async def main() -> None:
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            flight.do('a', lambda: asyncio.sleep(0, 'a')), flight.do('b', lambda: asyncio.sleep(0, 'b'))
+        )
+        assert results == ['a', 'b']
+        assert flight.coalesced == 0
+
+    asyncio.run(main())
+
+
+def test_exception_reaches_every_caller():
+    async def main() -> None:
+        flight = SingleFlight()
+
+        async def fail() -> None:
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        results = await asyncio.gather(*(flight.do('k', fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.stats()['inflight'] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def main() -> None:
+        flight = SingleFlight()
+
+        async def work() -> str:
+            await asyncio.sleep(0.02)
+            return 'done'
+
+        first = asyncio.create_task(flight.do('k', work))
+        second = asyncio.create_task(flight.do('k', work))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        assert await second == 'done'
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())